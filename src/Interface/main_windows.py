@@ -264,9 +264,18 @@ class MainWindow(ParameterMixin, VisualizationMixin, ResultMixin):
                 return
             
             frames = [(0, self.robo.NF - 1)]
-            symo = geometry.direct_geometric(self.robo, frames, trig_subs=True)
+            # le modèle est réutilisé : seules les matrices qui dépendent
+            # des repères modifiés sont recalculées
+            model = getattr(self, 'mgd_model', None)
+            if model is None or model.robo is not self.robo \
+                    or model.frames != frames:
+                model = geometry.GeometricModel(self.robo, frames)
+                self.mgd_model = model
+            else:
+                model.update()
+            symo = model.write()
             
-            result_text = self._read_output(symo.file_out.name)
+            result_text = symo.file_out.getvalue()
             self._display_result('mgd', "🔍 MODÈLE GÉOMÉTRIQUE DIRECT", result_text)
             
             if hasattr(self, 'renderer_3d') and self.renderer_3d:
@@ -328,14 +337,6 @@ class MainWindow(ParameterMixin, VisualizationMixin, ResultMixin):
             "🎯 Modèle Cinématique Inverse\n\n"
             "Fonctionnalité en développement.")
 
-    def _read_output(self, file_path):
-        """Lit le contenu d'un fichier"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            return f"❌ Erreur lecture: {e}\n\nChemin: {file_path}"
-
     def _display_result(self, result_id, title, content):
         """Affiche un résultat dans un onglet"""
         formatted = f"{title}\n\n{'='*60}\n\n{content}"
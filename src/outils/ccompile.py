@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+C backend of the SymbolManager of the SYMORO package.
+
+A model (order_list/sydi) is written as a self-contained C function
+that evaluates it for a batch of configurations, compiled with the
+system C compiler into a shared object and called through ctypes on
+NumPy arrays. The shared objects are cached under a hash of their
+source, so each model is compiled only once.
+"""
+
+import ctypes
+import hashlib
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from sympy import Expr, Symbol, ccode
+
+from outils import filemgr
+from outils.genfunc import struct_items, struct_shape
+
+BUILD_FOLDER = ".build"
+CFLAGS = ['-O2', '-shared', '-fPIC']
+# prefix of the local variables of the generated functions
+_PREFIX = '_symoro_'
+
+_C_HEADER = """#include <math.h>
+
+#ifndef M_PI
+#define M_PI 3.14159265358979323846
+#endif
+
+"""
+
+
+class CompileError(Exception):
+    """Raised when a model can not be compiled."""
+
+
+def get_build_path() -> Path:
+    """
+    Return and ensure the folder path of the compiled models.
+    """
+    folder_path = filemgr.get_base_path() / BUILD_FOLDER
+    filemgr.make_folders(folder_path)
+    return folder_path
+
+
+def get_compiler() -> str:
+    """
+    Return the C compiler command, $CC or cc.
+    """
+    return os.environ.get('CC', 'cc')
+
+
+def gen_c_source(symo, name: str, to_return, args, params=None) -> str:
+    """
+    Return the C source of the function that computes to_return.
+
+    The function has the signature
+
+        void name(const double *_symoro_in, double *_symoro_out,
+                  long _symoro_n)
+
+    _symoro_in holds n configurations laid out as args, _symoro_out
+    receives n results laid out as to_return, both in C order.
+
+    Args:
+        symo: SymbolManager that contains the model.
+        name: Name of the C function.
+        to_return: List, Matrix or tuple of them, determines the shape
+            of the output and the symbols inside it.
+        args: List, Matrix or tuple of them, determines the shape of
+            the input and the symbols names to be assigned.
+        params: Values of the used symbols that are neither in args
+            nor defined in symo, keyed by symbol names.
+    """
+    params = params or {}
+    arg_items = list(struct_items(args))
+    res_items = list(struct_items(to_return))
+    arg_syms = symo.extract_syms(args)
+    order_list = symo.sift_syms(symo.extract_syms(to_return), arg_syms)
+    missing = [s for s in order_list
+               if s not in symo.sydi and str(s) not in params]
+    if missing:
+        raise ValueError(
+            "Missing values for %s"
+            % ', '.join(sorted(str(s) for s in missing))
+        )
+    # the locals of the function are prefixed, so that they never
+    # collide with the symbols of the model
+    lines = [_C_HEADER]
+    lines.append('void %s(const double *%sin, double *%sout, long %sn)\n{\n'
+                 % (name, _PREFIX, _PREFIX, _PREFIX))
+    lines.append('    long {0}k;\n'.format(_PREFIX))
+    lines.append('    for ({0}k = 0; {0}k < {0}n; {0}k++) {{\n'
+                 .format(_PREFIX))
+    lines.append('        const double *{0}x = {0}in + {0}k*{1};\n'
+                 .format(_PREFIX, len(arg_items)))
+    lines.append('        double *{0}y = {0}out + {0}k*{1};\n'
+                 .format(_PREFIX, len(res_items)))
+    for flat, (index, s) in enumerate(arg_items):
+        if isinstance(s, Symbol):
+            lines.append('        const double %s = %sx[%s];\n'
+                         % (s, _PREFIX, flat))
+    for s in order_list:
+        if s not in symo.sydi:
+            val = repr(float(params[str(s)]))
+        elif isinstance(symo.sydi[s], tuple):
+            raise ValueError(
+                "Multivalued symbol %s can not be compiled" % s
+            )
+        else:
+            val = ccode(symo.sydi[s])
+        lines.append('        const double %s = %s;\n' % (s, val))
+    for flat, (index, s) in enumerate(res_items):
+        val = ccode(s) if isinstance(s, Expr) else repr(float(s))
+        lines.append('        %sy[%s] = %s;\n' % (_PREFIX, flat, val))
+    lines.append('    }\n}\n')
+    return ''.join(lines)
+
+
+def compile_source(source: str) -> Path:
+    """
+    Return the path of the shared object built from the C source.
+
+    The object is compiled only if it is not in the build folder yet;
+    it is written to a temporary file first and then renamed, so
+    concurrent builds of the same source are safe.
+    """
+    compiler = get_compiler()
+    key = hashlib.sha256(
+        '\n'.join([compiler] + CFLAGS + [source]).encode('utf-8')
+    ).hexdigest()
+    folder = get_build_path()
+    lib_path = folder / f"{key}.so"
+    if lib_path.exists():
+        return lib_path
+    src_path = folder / f"{key}.c"
+    src_path.write_text(source)
+    fd, tmp_name = tempfile.mkstemp(dir=folder, suffix='.so')
+    os.close(fd)
+    try:
+        subprocess.run([compiler] + CFLAGS + ['-o', tmp_name,
+                                               str(src_path), '-lm'],
+                       check=True, capture_output=True, text=True)
+        os.replace(tmp_name, lib_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise CompileError(getattr(e, 'stderr', None) or str(e))
+    return lib_path
+
+
+def load_function(lib_path, name: str, args, to_return):
+    """
+    Return a Python callable running the compiled function name.
+
+    The callable takes an array of shape (..., ) + shape of args and
+    returns an array of shape batch axes + shape of to_return, like
+    the functions made by SymbolManager.gen_vec_func.
+    """
+    lib = ctypes.CDLL(str(lib_path))
+    cfunc = getattr(lib, name)
+    # raw addresses are passed, data_as would be slower for small batches
+    cfunc.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+    cfunc.restype = None
+    in_shape = struct_shape(args)
+    out_shape = struct_shape(to_return)
+    out_size = max(int(np.prod(out_shape, dtype=int)), 1)
+
+    def func(arg):
+        x = np.ascontiguousarray(arg, dtype=float)
+        if x.shape[max(x.ndim - len(in_shape), 0):] != in_shape:
+            raise ValueError("Expected an array of shape (...,) + %s, got %s"
+                             % (in_shape, x.shape))
+        prefix = x.shape[:x.ndim - len(in_shape)]
+        out = np.empty(prefix + out_shape)
+        cfunc(x.ctypes.data, out.ctypes.data, out.size // out_size)
+        return out
+    # keeps the library loaded as long as the function is used
+    func.lib = lib
+    func.__name__ = name
+    return func
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Machine-readable equation stream of the SYMORO package.
+
+Next to the text output of a model, the SymbolManager can write one
+JSON record per equation (NDJSON), in generation order:
+
+    {"index": 0, "sym": "C1", "expr": "cos(Symbol('th1'))",
+     "deps": ["th1"], "ops": 1}
+
+expr is the srepr of the expression, so a model is loaded again in
+linear time by evaluating each record, without parsing the text.
+"""
+
+import gzip
+import json
+from pathlib import Path
+
+import sympy
+from sympy import Expr, Symbol, srepr
+
+from outils import filemgr
+from outils import tools
+
+STREAM_SUFFIX = ".ndjson"
+
+
+def _symbol(name: str, **assumptions):
+    """Symbol of a srepr, interned when it has no assumptions"""
+    if assumptions:
+        return Symbol(name, **assumptions)
+    return tools.get_sym(name)
+
+
+# names available when the srepr of an expression is evaluated
+_NAMESPACE = dict(vars(sympy))
+_NAMESPACE['Symbol'] = _symbol
+_NAMESPACE['__builtins__'] = {}
+
+
+def get_stream_path(robo, ext: str) -> Path:
+    """
+    Return the path of the stream written alongside the model file of
+    the robot with the extension ext.
+    """
+    return filemgr.get_file_path(robo, ext).with_suffix(STREAM_SUFFIX)
+
+
+def make_record(index: int, sym, val, deps=None) -> str:
+    """
+    Return the JSON record of the equation sym = val.
+
+    Args:
+        index: Position of the equation in the stream.
+        sym: Symbol defined by the equation.
+        val: Expression, or tuple of expressions for multivalued
+            symbols.
+        deps: Symbols val depends on; computed from val if not given.
+    """
+    if deps is None:
+        deps = val.atoms(Symbol) if isinstance(val, Expr) else ()
+    ops = tools.op_count(val) if isinstance(val, Expr) else 0
+    record = {
+        'index': index,
+        'sym': str(sym),
+        'expr': srepr(val),
+        'deps': sorted(str(s) for s in deps),
+        'ops': ops,
+    }
+    return json.dumps(record) + '\n'
+
+
+def dump(symo, path) -> None:
+    """
+    Write all the equations of a SymbolManager to a stream file.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, sym in enumerate(symo.order_list):
+            f.write(make_record(index, sym, symo.sydi[sym],
+                                symo.deps.get(sym)))
+
+
+def read_records(path):
+    """
+    Return an iterator over the records of a stream file.
+
+    The files ending with '.gz' are decompressed.
+    """
+    path = str(path)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load(path):
+    """
+    Return a SymbolManager holding the equations of a stream file.
+
+    The expressions are evaluated from their srepr, so the file must
+    come from a trusted source. When a symbol is written several
+    times, its last value is kept at its first position.
+    """
+    from outils import symbolmgr
+    sydi = {}
+    deps = {}
+    for record in read_records(path):
+        sym = tools.get_sym(record['sym'])
+        sydi[sym] = eval(record['expr'], _NAMESPACE)
+        deps[sym] = frozenset(tools.get_sym(name)
+                              for name in record['deps'])
+    symo = symbolmgr.SymbolManager(None)
+    symo.sydi = sydi
+    symo.revdi = dict((val, sym) for sym, val in sydi.items())
+    symo.order_list = list(sydi)
+    symo.deps = deps
+    symo.position = dict((s, i) for i, s in enumerate(symo.order_list))
+    return symo
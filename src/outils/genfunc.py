@@ -4,6 +4,7 @@ This module provides MATLAB function generation
 """
 
 from sympy import Matrix, Symbol
+from sympy.printing.numpy import NumPyPrinter
 
 
 def gen_fheader_matlab(symo, name, args,
@@ -140,3 +141,120 @@ def gen_fbody_matlab(symo, name, to_return, args, ret_name=''):
     func_body.append('end\n')
     func_body.insert(0, glob_item + '\n')
     return func_body
+
+
+def struct_shape(syms):
+    """Returns the array shape of a list, Matrix or tuple structure"""
+    if isinstance(syms, Matrix):
+        return syms.shape
+    elif isinstance(syms, (tuple, list)):
+        if len(syms) == 0:
+            return (0,)
+        shapes = set(struct_shape(item) for item in syms)
+        if len(shapes) > 1:
+            raise ValueError("Items of different shapes: %s" % sorted(shapes))
+        return (len(syms),) + shapes.pop()
+    else:
+        return ()
+
+
+def struct_items(syms, index=()):
+    """Yields (index, element) pairs of a list, Matrix or tuple structure
+    with the same indexing as the array of shape struct_shape(syms)
+    """
+    if isinstance(syms, Matrix):
+        for i in range(syms.shape[0]):
+            for j in range(syms.shape[1]):
+                yield index + (i, j), syms[i, j]
+    elif isinstance(syms, (tuple, list)):
+        for k, item in enumerate(syms):
+            for res in struct_items(item, index + (k,)):
+                yield res
+    else:
+        yield index, syms
+
+
+# prefix of the local names of the generated vectorized functions
+_PREFIX = '_symoro_'
+
+
+class _NumPyPrinter(NumPyPrinter):
+    """NumPy printer that refers to numpy through the prefixed alias,
+    so that no model symbol can hide a NumPy function"""
+    def __init__(self):
+        super().__init__({'fully_qualified_modules': True})
+
+    def _module_format(self, fqn, register=True):
+        if fqn.startswith('numpy.'):
+            fqn = _PREFIX + 'np.' + fqn[len('numpy.'):]
+        return super()._module_format(fqn, register)
+
+
+def gen_fheader_numpy(symo, name, args):
+    printer = _NumPyPrinter()
+    func_head = []
+    func_head.append('def {1}(*{0}args):\n'.format(_PREFIX, name))
+    func_head.append('    import numpy as {0}np\n'.format(_PREFIX))
+    for i, arg in enumerate(args):
+        func_head.append(
+            '    {0}arg{1} = {0}np.asarray({0}args[{1}], dtype=float)\n'
+            .format(_PREFIX, i))
+        if i == 0:
+            func_head.append(
+                '    {0}prefix = {0}arg0.shape[:{0}arg0.ndim - {1}]\n'
+                .format(_PREFIX, len(struct_shape(arg))))
+        for index, s in struct_items(arg):
+            if isinstance(s, Symbol):
+                idx = ', '.join(str(k) for k in index)
+                func_head.append('    %s = %sarg%s[..., %s]\n'
+                                 % (printer.doprint(s), _PREFIX, i, idx))
+    if len(args) == 0:
+        func_head.append('    %sprefix = ()\n' % _PREFIX)
+    return func_head
+
+
+def gen_fbody_numpy(symo, name, to_return, args, params):
+    """Generates list of string statements of the function that
+    computes to_return for a batch of configurations. Every
+    intermediate symbol is computed once, as an array over the
+    leading batch axes of the arguments.
+
+    Parameters
+    ==========
+    params: dict
+        Values of the symbols that are neither arguments
+        nor defined in symo, keyed by symbol names
+    """
+    arg_syms = symo.extract_syms(args)
+    res_syms = symo.extract_syms(to_return)
+    order_list = symo.sift_syms(res_syms, arg_syms)
+    missing = [s for s in order_list
+               if s not in symo.sydi and str(s) not in params]
+    if missing:
+        raise ValueError(
+            "Missing values for %s"
+            % ', '.join(sorted(str(s) for s in missing))
+        )
+    # the locals of the function are prefixed, so that they never
+    # collide with the symbols of the model
+    printer = _NumPyPrinter()
+    func_body = []
+    for s in order_list:
+        if s not in symo.sydi:
+            val = repr(float(params[str(s)]))
+        elif isinstance(symo.sydi[s], tuple):
+            raise ValueError(
+                "Multivalued symbol %s can not be vectorized" % s
+            )
+        else:
+            val = printer.doprint(symo.sydi[s])
+        func_body.append('    %s = %s\n' % (printer.doprint(s), val))
+    shape = struct_shape(to_return)
+    func_body.append('    {0}result = {0}np.empty({0}prefix + {1})\n'
+                     .format(_PREFIX, shape))
+    for index, s in struct_items(to_return):
+        idx = ''.join(', %s' % k for k in index)
+        func_body.append('    %sresult[...%s] = %s\n'
+                         % (_PREFIX, idx, printer.doprint(s)))
+    func_body.append('    return %sresult\n' % _PREFIX)
+    return func_body
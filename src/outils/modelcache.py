@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the generated models of the SYMORO package.
+
+Each entry is a pickle file named after a hash of the robot parameters,
+the model type and the generation options, so that a model is computed
+only once for a given robot description. Files are written atomically
+and the oldest entries are removed when the cache exceeds its size
+limit, which makes the cache safe to share between several processes.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from sympy import srepr, sympify
+
+from outils import filemgr
+from outils import symbolmgr
+
+CACHE_FOLDER = ".cache"
+CACHE_VERSION = 3
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# attributes that do not change the generated models
+_IGNORED_ATTRS = ('directory', 'par_file_path')
+
+
+def get_cache_path() -> Path:
+    """
+    Return and ensure the folder path of the model cache.
+    """
+    folder_path = filemgr.get_base_path() / CACHE_FOLDER
+    filemgr.make_folders(folder_path)
+    return folder_path
+
+
+def robot_fingerprint(robo) -> str:
+    """
+    Return a canonical text description of the robot parameters.
+
+    Args:
+        robo: An instance of the Robot class.
+    """
+    items = []
+    for name in sorted(vars(robo)):
+        if name.startswith('_') or name in _IGNORED_ATTRS:
+            continue
+        val = getattr(robo, name)
+        if isinstance(val, (str, bool)) or val is None:
+            items.append(f"{name}={val!r}")
+        else:
+            items.append(f"{name}={srepr(sympify(val))}")
+    return "\n".join(items)
+
+
+def make_key(robo, model: str, **options) -> str:
+    """
+    Return the cache key of a model of the robot.
+
+    Args:
+        robo: An instance of the Robot class.
+        model: Model type, usually the extension of its output file.
+        options: Generation options of the model.
+    """
+    text = "\n".join([
+        f"version={CACHE_VERSION}",
+        f"model={model}",
+        f"options={sorted(options.items())!r}",
+        robot_fingerprint(robo),
+    ])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return get_cache_path() / f"{key}.pkl"
+
+
+def load(key: str):
+    """
+    Return the payload stored under the key, or None if there is none.
+    """
+    path = _entry_path(key)
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    try:
+        # mark the entry as recently used
+        os.utime(path)
+    except OSError:
+        pass
+    return payload
+
+
+def store(key: str, payload, max_size: int = MAX_CACHE_SIZE) -> None:
+    """
+    Store the payload under the key and evict the oldest entries.
+
+    The entry is written to a temporary file first and then renamed,
+    so a concurrent reader never sees a partially written entry.
+    """
+    path = _entry_path(key)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+    evict(max_size)
+
+
+def evict(max_size: int = MAX_CACHE_SIZE) -> None:
+    """
+    Remove the least recently used entries until the cache fits in
+    max_size bytes.
+    """
+    entries = []
+    for path in get_cache_path().glob('*.pkl'):
+        try:
+            stat = path.stat()
+        except OSError:
+            # removed by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_size:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        total -= size
+
+
+def clear() -> None:
+    """
+    Remove all the entries of the cache.
+    """
+    evict(0)
+
+
+def save_model(key: str, symo, extra=None) -> None:
+    """
+    Store the symbol table and the output text of a model.
+
+    Args:
+        key: Cache key given by make_key.
+        symo: SymbolManager that contains the model; its output file
+            must be closed.
+        extra: Any other picklable result to store with the model.
+    """
+    text = None
+    name = getattr(symo.file_out, 'name', None)
+    if hasattr(symo.file_out, 'getvalue'):
+        text = symo.file_out.getvalue()
+    elif name is not None:
+        with open(name) as f:
+            text = f.read()
+    state = {
+        'sydi': symo.sydi,
+        'revdi': symo.revdi,
+        'order_list': symo.order_list,
+    }
+    store(key, (state, text, extra))
+
+
+def load_model(key: str, robo, ext: str):
+    """
+    Return (symo, extra) stored under the key, or None.
+
+    The output text of the model is written again to the file of the
+    robot with the extension ext, as file_open would have done.
+    """
+    payload = load(key)
+    if payload is None:
+        return None
+    state, text, extra = payload
+    symo = symbolmgr.SymbolManager(None)
+    symo.sydi = state['sydi']
+    symo.revdi = state['revdi']
+    symo.order_list = state['order_list']
+    symo.rebuild_index()
+    if text is not None:
+        symo.file_open(robo, ext)
+        symo.file_out.write(text)
+        symo.file_out.close()
+    return symo, extra
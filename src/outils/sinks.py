@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Output sinks of the SymbolManager of the SYMORO package.
+
+A sink receives the text written by SymbolManager.write_line. It
+provides the write, flush and close methods of a file object, and
+getvalue, which returns the text written so far, so that the models
+can be displayed; the file sinks read their output file again unless
+they are asked to keep the text.
+"""
+
+import gzip
+import io
+import sys
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class Sink:
+    """
+    Base class of the sinks. The text is discarded.
+    """
+    name = None
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        return ''
+
+
+class NullSink(Sink):
+    """
+    Sink that discards the text, to measure the generation alone.
+    """
+
+
+class ScreenSink(Sink):
+    """
+    Sink that prints the text on the standard output.
+    """
+    def write(self, text: str) -> int:
+        return sys.stdout.write(text)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+
+class BufferSink(Sink):
+    """
+    Sink that keeps the text in memory.
+    """
+    def __init__(self):
+        self._buffer = io.StringIO()
+
+    def write(self, text: str) -> int:
+        return self._buffer.write(text)
+
+    def getvalue(self) -> str:
+        return self._buffer.getvalue()
+
+
+class FileSink(Sink):
+    """
+    Sink that writes the text to a file through a large buffer.
+
+    Args:
+        path: Path of the output file.
+        buffer_size: Size in bytes of the write buffer.
+        keep_text: If True, the text is also kept in memory and
+            getvalue does not read the file. Off by default, so large
+            models are streamed to the file only.
+    """
+    def __init__(self, path, buffer_size: int = BUFFER_SIZE,
+                 keep_text: bool = False):
+        self.name = str(path)
+        self._file = self._open(buffering=buffer_size)
+        self._buffer = io.StringIO() if keep_text else None
+
+    def _open(self, buffering):
+        return open(self.name, 'w', buffering=buffering, encoding='utf-8')
+
+    def _read(self):
+        with open(self.name, encoding='utf-8') as f:
+            return f.read()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, text: str) -> int:
+        if self._buffer is not None:
+            self._buffer.write(text)
+        return self._file.write(text)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def getvalue(self) -> str:
+        if self._buffer is not None:
+            return self._buffer.getvalue()
+        if not self.closed:
+            self.flush()
+        return self._read()
+
+
+class GzipSink(FileSink):
+    """
+    Sink that writes the text to a gzip compressed file, for the
+    models too large to be kept as plain text. '.gz' is added to the
+    path if needed and the text is not kept in memory.
+
+    Args:
+        path: Path of the output file.
+        compresslevel: Compression level, from 1 (fast) to 9.
+    """
+    def __init__(self, path, compresslevel: int = 6):
+        path = str(path)
+        if not path.endswith('.gz'):
+            path += '.gz'
+        self.compresslevel = compresslevel
+        super().__init__(path, keep_text=False)
+
+    def _open(self, buffering):
+        return gzip.open(self.name, 'wt', encoding='utf-8',
+                         compresslevel=self.compresslevel)
+
+    def _read(self):
+        with gzip.open(self.name, 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def fileno(self) -> int:
+        return self._file.fileobj.fileno()
@@ -7,17 +7,23 @@
 
 """This module contains the Symbol Manager tools."""
 
-import itertools
 import os
+import re
+import sys
 
 from sympy import sin, cos
-from sympy import Symbol, Matrix, Expr
-from sympy import Mul, Add, factor, var, sympify
+from sympy import Symbol, Matrix, MatrixBase, Expr
+from sympy import Mul, factor, sympify, cse, numbered_symbols
 from functools import reduce
 
+from outils import ccompile
+from outils import eqstream
 from outils import filemgr
+from outils import sinks
 from outils import tools
+from outils import trigsimp
 from outils.genfunc import gen_fheader_matlab, gen_fbody_matlab
+from outils.genfunc import gen_fheader_numpy, gen_fbody_numpy, struct_items
 
 class SymbolManager(object):
     """Symbol manager, responsible for symbol replacing, file writing."""
@@ -33,6 +39,35 @@ class SymbolManager(object):
         """Dictionary. Revers to the self.sydi"""
         self.order_list = list(sydi.keys())
         """keeps the order of variables to be compute"""
+        self.unfolded = {}
+        """Dictionary. Cache of the fully unfolded symbol values"""
+        self.deps = {}
+        """Dictionary. Direct dependencies (symbols) of each symbol"""
+        self.position = {}
+        """Dictionary. Index of each symbol in order_list"""
+        self.vec_funcs = {}
+        """Dictionary. Cache of the functions made by gen_vec_func"""
+        self.stream = None
+        """Output of the NDJSON equation records, see eqstream"""
+        self.stream_count = 0
+        """Number of records written to stream"""
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Recomputes the dependency graph (deps, position) from
+        order_list and sydi. Needed only after order_list has been
+        reorganized, add_to_dict keeps it up to date.
+        """
+        self.deps = dict((s, self._direct_deps(self.sydi[s]))
+                         for s in self.order_list)
+        self.position = dict((s, i) for i, s in enumerate(self.order_list))
+        self.vec_funcs = {}
+
+    @staticmethod
+    def _direct_deps(val):
+        if isinstance(val, Expr):
+            return frozenset(val.atoms(Symbol))
+        return frozenset()
 
     def simp(self, sym):
         sym = factor(sym)
@@ -51,25 +86,10 @@ class SymbolManager(object):
         """
         Example
         =======
-        >> print C2S2_simp(sympify("-C**2*RL + S*(D - RL*S)"))
-        D*S - RL
-        """
-        if not sym.is_Add:
-            repl_dict = {}
-            for term in sym.atoms(Add):
-                repl_dict[term] = self.C2S2_simp(term)
-            sym = sym.xreplace(repl_dict)
-            return sym
-        names, short_form = tools.trignometric_info(sym)
-        for name in names:
-            if short_form:
-                cos_term, sin_term = tools.cos_sin_syms(name)
-            else:
-                cos_term, sin_term = cos(name), sin(name)
-            sym = self.try_opt(
-                tools.ONE, None, sin_term**2, cos_term**2, sym
-            )
-        return sym
+        >> print C2S2_simp(sympify("-C2**2*RL + RL - D*S2"))
+        RL*S2**2 - D*S2
+        """
+        return trigsimp.c2s2_simp(sympify(sym))[0]
 
     def CS12_simp(self, sym, silent=False):
         """
@@ -79,75 +99,20 @@ class SymbolManager(object):
         C23 = C2*C3 - S2*S3
         C23
         >> print SymbolManager().CS12_simp(sympify("C2*S3*R + S2*C3*R"))
-        S23 = C2*S3 + S2*C3
+        S23 = C2*S3 + C3*S2
         R*S23
+
+        Notes
+        =====
+        If silent is True, the definitions of the new symbols
+        (C23, S23...) are not added to the dictionary
         """
-        if not sym.is_Add:
-            repl_dict = {}
-            for term in sym.atoms(Add):
-                repl_dict[term] = self.CS12_simp(term)
-            sym = sym.xreplace(repl_dict)
-            return sym
-        names, short_form = tools.trignometric_info(sym)
-        names = list(names)
-        if short_form:
-            names.sort()
-        sym2 = sym
-        for n1, n2 in itertools.combinations(names, 2):
-            if short_form:
-                C1, S1 = tools.cos_sin_syms(n1)
-                C2, S2 = tools.cos_sin_syms(n2)
-                np1, nm1 = tools.get_pos_neg(n1)
-                np2, nm2 = tools.get_pos_neg(n2)
-                n12 = tools.ang_sum(np1, np2, nm1, nm2)
-                nm12 = tools.ang_sum(np1, nm2, nm1, np2)
-                C12, S12 = tools.cos_sin_syms(n12)
-                C1m2, S1m2 = tools.cos_sin_syms(nm12)
-            else:
-                C1, S1 = cos(n1), sin(n1)
-                C2, S2 = cos(n2), sin(n2)
-                C12, S12 = cos(n1+n2), sin(n1+n2)
-                C1m2, S1m2 = cos(n1-n2), sin(n1-n2)
-            sym2 = self.try_opt(S12, S1m2, S1*C2, C1*S2, sym2, silent)
-            sym2 = self.try_opt(C12, C1m2, C1*C2, -S1*S2, sym2, silent)
-        if sym2 != sym:
-            return self.CS12_simp(sym2, silent)
-        else:
-            return sym
-
-    def try_opt(self, A, Am, B, C, old_sym, silent=False):
-        """Replaces B + C by A or B - C by Am.
-        Chooses the best option.
-        """
-        Bcfs = tools.get_max_coef_list(old_sym, B)
-        Ccfs = tools.get_max_coef_list(old_sym, C)
-        if Bcfs != [] and Ccfs != []:
-            Res = old_sym
-            Res_tmp = Res
-            for coef in Bcfs:
-                Res_tmp += A*coef - B*coef - C*coef
-                if tools.sym_less(Res_tmp, Res):
-                    Res = Res_tmp
-            if tools.sym_less(Res, old_sym) and Am is None:
-                if not A.is_number and not silent:
-                    self.add_to_dict(A, B + C)
-                return Res
-            elif Am is not None:
-                Res2 = old_sym
-                Res_tmp = Res2
-                for coef in Bcfs:
-                    Res_tmp += Am*coef - B*coef + C*coef
-                    if tools.sym_less(Res_tmp, Res2):
-                        Res2 = Res_tmp
-                if tools.sym_less(Res2, Res) and tools.sym_less(Res2, old_sym):
-                    if not Am.is_number and not silent:
-                        self.add_to_dict(Am, B - C)
-                    return Res2
-                elif tools.sym_less(Res, old_sym):
-                    if not A.is_number and not silent:
-                        self.add_to_dict(A, B + C)
-                    return Res
-        return old_sym
+        sym, defs = trigsimp.cs12_simp(sympify(sym))
+        if not silent:
+            for new_sym, old_sym in defs:
+                if not new_sym.is_number:
+                    self.add_to_dict(new_sym, old_sym)
+        return sym
 
     def add_to_dict(self, new_sym, old_sym):
         """Internal function.
@@ -160,6 +125,8 @@ class SymbolManager(object):
         if new_sym not in self.sydi:
             self.sydi[new_sym] = old_sym
             self.revdi[old_sym] = new_sym
+            self.deps[new_sym] = self._direct_deps(old_sym)
+            self.position[new_sym] = len(self.order_list)
             self.order_list.append(new_sym)
             self.write_equation(new_sym, old_sym)
 
@@ -184,16 +151,33 @@ class SymbolManager(object):
         if not isinstance(angle, Expr) or angle.is_number:
             return M
         cos_sym, sin_sym = tools.cos_sin_syms(name)
-        sym_list = [(cos_sym, cos(angle)), (sin_sym, sin(angle))]
+        split = tools.split_right_angle(angle)
+        if split is None:
+            cos_angle, sin_angle = cos(angle), sin(angle)
+        else:
+            # angle = const + rest with cos(const), sin(const) in {0, 1, -1}
+            const, rest = split
+            c, s = tools.cos_sin(const)
+            cos_angle = c*cos(rest) - s*sin(rest)
+            sin_angle = s*cos(rest) + c*sin(rest)
+        sym_list = [(cos_sym, cos_angle), (sin_sym, sin_angle)]
         subs_dict = {}
         for sym, sym_old in sym_list:
             if -1 in Mul.make_args(sym_old):
                 sym_old = -sym_old
             subs_dict[sym_old] = sym
             self.add_to_dict(sym, sym_old)
+        if not isinstance(M, MatrixBase):
+            return M.xreplace(subs_dict)
         for i1 in range(M.shape[0]):
             for i2 in range(M.shape[1]):
-                M[i1, i2] = M[i1, i2].subs(subs_dict)
+                elem = M[i1, i2]
+                # atoms (numbers, symbols) can not contain cos or sin
+                if elem.is_Atom:
+                    continue
+                new_elem = elem.xreplace(subs_dict)
+                if new_elem is not elem:
+                    M[i1, i2] = new_elem
         return M
 
     #TODO remove index
@@ -227,7 +211,7 @@ class SymbolManager(object):
             for i in (1, -1):
                 if i * old_sym in self.revdi:
                     return i * self.revdi[i * old_sym]
-        new_sym = var(str(name) + str(index))
+        new_sym = tools.get_sym(str(name) + str(index))
         self.add_to_dict(new_sym, old_sym)
         return new_sym
 
@@ -301,9 +285,231 @@ class SymbolManager(object):
         expr: symbolic expression
             Unfolded expression
         """
-        while set(self.sydi.keys()) & expr.atoms():
-            expr = expr.subs(self.sydi)
-        return expr
+        if len(self.unfolded) < len(self.sydi):
+            for s in self.order_list:
+                self.unfold_sym(s)
+        return expr.xreplace(self.unfolded)
+
+    def unfold_sym(self, sym):
+        """Returns the fully unfolded value of a symbol of the dictionary.
+        The results are memoized in self.unfolded, so every value is
+        expanded only once, with a single xreplace.
+        """
+        if sym in self.unfolded:
+            return self.unfolded[sym]
+        val = self.sydi[sym]
+        if isinstance(val, Expr):
+            for s in val.free_symbols:
+                if s in self.sydi and s not in self.unfolded:
+                    self.unfold_sym(s)
+            val = val.xreplace(self.unfolded)
+        else:
+            # multivalued symbols (tuples) are kept as they are
+            val = sym
+        self.unfolded[sym] = val
+        return val
+
+    def merge(self, other):
+        """Adds the relations of another symbol manager, in the order
+        of other.order_list. The result does not depend on the order
+        in which the other managers were built.
+
+        Parameters
+        ==========
+        other: SymbolManager
+            Manager built independently, e.g. in another process
+
+        Returns
+        =======
+        renames: dict
+            Symbols of other that have been replaced: a symbol already
+            defined with another value is an alias of an existing
+            symbol with that value, or is renamed as name_k
+
+        Notes
+        =====
+        Symbols defined with the same value in both managers, like
+        C2 or A0102, are kept only once.
+        """
+        renames = {}
+        for sym in other.order_list:
+            val = other.sydi[sym]
+            if isinstance(val, tuple):
+                val = tuple(v.xreplace(renames) for v in val)
+            elif isinstance(val, Expr):
+                val = val.xreplace(renames)
+            if sym not in self.sydi:
+                self.add_to_dict(sym, val)
+            elif self.sydi[sym] != val:
+                if val in self.revdi:
+                    renames[sym] = self.revdi[val]
+                else:
+                    new_sym = self._free_sym(sym, other.sydi)
+                    self.add_to_dict(new_sym, val)
+                    renames[sym] = new_sym
+        return renames
+
+    def _free_sym(self, sym, taken=()):
+        k = 1
+        new_sym = Symbol('%s_%s' % (sym, k))
+        while new_sym in self.sydi or new_sym in taken:
+            k += 1
+            new_sym = Symbol('%s_%s' % (sym, k))
+        return new_sym
+
+    def eliminate_common_subexpressions(self, name='CSE'):
+        """Introduces shared intermediate symbols for the subexpressions
+        repeated across the whole model (order_list/sydi).
+
+        Parameters
+        ==========
+        name: string, optional
+            Prefix of the new symbols, they are numbered from 1
+
+        Returns
+        =======
+        new_syms: list of var
+            The introduced symbols, in computation order
+
+        Notes
+        =====
+        The equations are not written by this function. When the pass
+        is used, the model is usually generated with file_out set to
+        None and written afterwards by write_equations.
+        """
+        keys = [s for s in self.order_list
+                if isinstance(self.sydi[s], Expr)]
+        if not keys:
+            return []
+        used = set(str(s) for s in self.sydi)
+        for s in keys:
+            used |= set(str(x) for x in self.sydi[s].free_symbols)
+        gen = numbered_symbols(name, start=1,
+                               exclude=[Symbol(x) for x in used])
+        repl, exprs = cse([self.sydi[s] for s in keys], symbols=gen)
+        if not repl:
+            return []
+        repl_dict = dict(repl)
+        repl_pos = dict((sym, i) for i, (sym, _) in enumerate(repl))
+        new_vals = dict(zip(keys, exprs))
+        order_list = []
+        done = set()
+
+        def emit(expr):
+            # the set of free symbols is walked in the order of repl,
+            # so the output does not depend on hashing
+            atoms = [x for x in expr.free_symbols if x in repl_dict]
+            for atom in sorted(atoms, key=repl_pos.get):
+                if atom not in done:
+                    emit(repl_dict[atom])
+                    done.add(atom)
+                    order_list.append(atom)
+
+        for s in self.order_list:
+            if s in new_vals:
+                emit(new_vals[s])
+                self.sydi[s] = new_vals[s]
+                self.revdi[new_vals[s]] = s
+            order_list.append(s)
+        for new_sym, old_sym in repl:
+            self.sydi[new_sym] = old_sym
+            self.revdi[old_sym] = new_sym
+        self.order_list = order_list
+        self.rebuild_index()
+        return [s for s in order_list if s in repl_dict]
+
+    def optimize(self, outputs=None, name='CSE'):
+        """Removes the work that is not needed from the model
+        (order_list/sydi):
+
+        - the symbols defined as a number or as another symbol are
+          replaced by their value in the following equations;
+        - if outputs is given, the symbols that are not needed to
+          compute them are removed;
+        - the remaining symbols named name1, name2... are numbered
+          again without gaps, in computation order.
+
+        Parameters
+        ==========
+        outputs: list, Matrix or tuple of them, optional
+            Requested results of the model. Their symbols are always
+            kept, even when they are constants or aliases
+        name: string, optional
+            Prefix of the numbered symbols, see
+            eliminate_common_subexpressions
+
+        Returns
+        =======
+        removed: list of var
+            The symbols that are no longer defined
+        """
+        kept = None if outputs is None else self.extract_syms(outputs)
+        subs = {}
+        for s in self.order_list:
+            val = self.sydi[s]
+            if isinstance(val, tuple):
+                self.sydi[s] = tuple(v.xreplace(subs) for v in val)
+                continue
+            if not isinstance(val, Expr):
+                continue
+            val = val.xreplace(subs)
+            self.sydi[s] = val
+            if val.is_number or isinstance(val, Symbol):
+                subs[s] = val
+        order_list = [s for s in self.order_list
+                      if s not in subs or (kept is not None and s in kept)]
+        self.order_list = order_list
+        self.rebuild_index()
+        if kept is not None:
+            order_list = self.sift_syms(kept, set())
+            order_list = [s for s in order_list if s in self.position]
+        needed = set(order_list)
+        removed = [s for s in self.sydi if s not in needed]
+        for s in removed:
+            del self.sydi[s]
+        renames = self._numbered_renames(order_list, name)
+        self.sydi = dict((renames.get(s, s), self._xreplace(val, renames))
+                         for s, val in self.sydi.items())
+        self.order_list = [renames.get(s, s) for s in order_list]
+        self.revdi = dict((val, s) for s, val in self.sydi.items())
+        self.unfolded = {}
+        self.rebuild_index()
+        return removed
+
+    def _numbered_renames(self, order_list, name):
+        pattern = re.compile('^%s([0-9]+)$' % re.escape(name))
+        numbered = [s for s in order_list if pattern.match(s.name)]
+        free = set()
+        for s in order_list:
+            free |= self.deps[s]
+        free -= set(order_list)
+        renames = {}
+        gen = numbered_symbols(name, start=1, exclude=free)
+        for s in numbered:
+            new_sym = next(gen)
+            if new_sym != s:
+                renames[s] = new_sym
+        return renames
+
+    @staticmethod
+    def _xreplace(val, renames):
+        if isinstance(val, tuple):
+            return tuple(v.xreplace(renames) for v in val)
+        elif isinstance(val, Expr):
+            return val.xreplace(renames)
+        return val
+
+    def write_equations(self, syms=None):
+        """Writes the equations of the model in computation order
+
+        Parameters
+        ==========
+        syms: iterable of var, optional
+            If given, only the equations of these symbols are written
+        """
+        for s in self.order_list:
+            if syms is None or s in syms:
+                self.write_equation(s, self.sydi[s])
 
     def mat_unfold(self, mat):
         for i in range(mat.shape[0]):
@@ -403,7 +609,15 @@ class SymbolManager(object):
         B: expression or var
             right-hand side of the equation
         """
+        if self.file_out is None:
+            # nothing is written, skip the printing of the expressions
+            return
         self.write_line(str(A) + ' = ' + str(B) + ';')
+        if self.stream is not None:
+            record = eqstream.make_record(self.stream_count, A, B,
+                                          self.deps.get(A))
+            self.stream.write(record)
+            self.stream_count += 1
 
     def write_line(self, line=''):
         """Writes string data into tha output with new line symbol
@@ -422,11 +636,15 @@ class SymbolManager(object):
         """
         Flush the buffer and make sure the data is written to the disk
         """
-        self.file_out.flush()
-        if self.file_out != 'disp':
-            os.fsync(self.file_out.fileno())
+        if self.file_out == 'disp':
+            sys.stdout.flush()
+        elif self.file_out is not None:
+            self.file_out.flush()
+            if hasattr(self.file_out, 'fileno'):
+                os.fsync(self.file_out.fileno())
 
-    def file_open(self, robo, ext):
+    def file_open(self, robo, ext, sink=None, stream=False,
+                  keep_text=False):
         """
         Initialize file stream
 
@@ -436,24 +654,38 @@ class SymbolManager(object):
             provides the robot's name
         ext: string
             provides the file name extention
+        sink: callable, optional
+            Called with the file path, returns the output object,
+            sinks.FileSink by default. sinks.GzipSink compresses the
+            output.
+        stream: bool, optional
+            If True, the equations are also written as NDJSON records
+            to the .ndjson file of the same name (see eqstream)
+        keep_text: bool, optional
+            If True and sink is not given, the text is also kept in
+            memory, for the callers that read it back with getvalue
         """
         fname = filemgr.get_file_path(robo, ext)
-        self.file_out = open(fname, 'w')
+        if sink is None:
+            self.file_out = sinks.FileSink(fname, keep_text=keep_text)
+        else:
+            self.file_out = sink(fname)
+        if stream:
+            self.stream = sinks.FileSink(eqstream.get_stream_path(robo, ext),
+                                         keep_text=False)
+            self.stream_count = 0
 
     def file_close(self):
         """
-        Initialize file stream
-
-        Parameters
-        ==========
-        robo: Robot instance
-            provides the robot's name
-        ext: string
-            provides the file name extention
+        Writes the operation counts of the model (see op_report) and
+        the end mark, then closes the output
         """
         if self.file_out is not None:
+            self.write_op_report()
             self.write_line('*=*')
             self.file_out.close()
+        if self.stream is not None:
+            self.stream.close()
 
     def gen_fheader(self, name, *args):
         fun_head = []
@@ -517,18 +749,89 @@ class SymbolManager(object):
     def sift_syms(self, rq_syms, wr_syms):
         """Returns ordered list of variables to be compute
         """
-        order_list = []   # vars that are defined in sydi
-        for s in reversed(self.order_list):
-            if s in rq_syms and not s in wr_syms:
-                order_list.insert(0, s)
-                s_val = self.sydi[s]
-                if isinstance(s_val, Expr):
-                    atoms = s_val.atoms(Symbol)
-                    rq_syms |= {s for s in atoms if not s.is_number}
-        rq_vals = [s for s in rq_syms if not (s in self.sydi or s in wr_syms)]
-            # required vars that are not defined in sydi
-            # will be set to '1.'
-        return rq_vals + order_list
+        needed = set()    # vars that are defined in sydi
+        rq_vals = set()   # required vars that are not defined in sydi
+        stack = list(rq_syms)
+        while stack:
+            s = stack.pop()
+            if s in needed or s in rq_vals or s in wr_syms:
+                continue
+            if s in self.position:
+                needed.add(s)
+                stack.extend(self.deps[s])
+            elif s not in self.sydi:
+                rq_vals.add(s)
+        order_list = sorted(needed, key=self.position.__getitem__)
+        # required vars that are not defined in sydi
+        # will be set to '1.', sorted so that the order does not
+        # depend on hashing
+        return sorted(rq_vals, key=str) + order_list
+
+    def model_ops(self, to_return):
+        """Returns the number of operations needed to compute to_return:
+        the operations of every needed equation, counted once, plus
+        the operations in the elements of to_return.
+
+        Parameters
+        ==========
+        to_return: list, Matrix or tuple of them
+        """
+        total = 0
+        for s in self.sift_syms(self.extract_syms(to_return), set()):
+            val = self.sydi.get(s)
+            if isinstance(val, Expr):
+                total += tools.op_count(val)
+        for index, elem in struct_items(to_return):
+            if isinstance(elem, Expr):
+                total += tools.op_count(elem)
+        return total
+
+    def op_report(self, outputs=None):
+        """Returns the operation counts of the model by kind of
+        operation (see tools.op_kinds), for every equation of
+        order_list and in total.
+
+        Parameters
+        ==========
+        outputs: list, Matrix or tuple of them, optional
+            If given, only the equations needed to compute outputs
+            are counted, with the operations in its elements
+
+        Returns
+        =======
+        report: dict
+            'equations' maps each counted symbol, in computation order,
+            to its counts; 'total' holds the sums. All the counts have
+            the keys of tools.OP_KINDS and 'total'.
+        """
+        if outputs is None:
+            syms = self.order_list
+        else:
+            syms = [s for s in self.sift_syms(self.extract_syms(outputs),
+                                              set())
+                    if s in self.sydi]
+        equations = {}
+        total = dict.fromkeys(tools.OP_KINDS + ('total',), 0)
+        for s in syms:
+            counts = tools.op_kinds(self.sydi[s])
+            counts['total'] = sum(counts.values())
+            equations[s] = counts
+            for kind, n in counts.items():
+                total[kind] += n
+        if outputs is not None:
+            for index, elem in struct_items(outputs):
+                for kind, n in tools.op_kinds(elem).items():
+                    total[kind] += n
+                    total['total'] += n
+        return {'equations': equations, 'total': total}
+
+    def write_op_report(self, outputs=None):
+        """Writes the total operation counts of op_report"""
+        total = self.op_report(outputs)['total']
+        self.write_line('Number of operations')
+        self.write_line(', '.join('%s: %s' % (kind, total[kind])
+                                  for kind in tools.OP_KINDS + ('total',)))
+        self.write_line()
 
     def gen_fbody(self, name, to_return, args):
         """Generates list of string statements of the function that
@@ -623,4 +926,88 @@ class SymbolManager(object):
         exec(self.gen_func_string(name, to_return, args))
         return eval('%s' % name)
 
+    def gen_vec_func(self, name, to_return, args, params=None):
+        """ Returns function that computes what is in to_return for
+        a batch of configurations. The function is cached, so calling
+        gen_vec_func again with the same arguments is cheap.
 
+         Parameters
+        ==========
+        name: string
+            Future function's name
+        to_return: list, Matrix or tuple of them
+            Determins the shape of the output and symbols inside it
+        args: list, Matrix or tuple of them
+            Determins the shape of the input and symbols
+            names to assigned
+        params: dict, optional
+            Numerical values of the used symbols that are neither
+            in args nor defined in the model. Keys can be symbols
+            or symbol names.
+
+        Notes
+        =====
+        -The returned function takes an array of shape
+            (..., ) + shape of args. The leading axes are the batch
+            axes, the result has shape batch axes + shape of to_return.
+        -Unlike gen_func, a ValueError is raised if a used symbol
+            has no value.
+        """
+        params = dict((str(k), float(v)) for k, v in (params or {}).items())
+        key = (name, self.convert_syms(to_return), self.convert_syms(args),
+               tuple(sorted(params.items())), len(self.order_list))
+        if key not in self.vec_funcs:
+            fun_head = gen_fheader_numpy(self, name, (args,))
+            fun_body = gen_fbody_numpy(self, name, to_return, args, params)
+            namespace = {}
+            exec("".join(fun_head + fun_body), namespace)
+            self.vec_funcs[key] = namespace[name]
+        return self.vec_funcs[key]
+
+    def gen_c_func(self, name, to_return, args, params=None, fallback=True):
+        """ Returns function that computes what is in to_return for
+        a batch of configurations with compiled C code. It takes and
+        returns the same arrays as the function made by gen_vec_func.
+
+         Parameters
+        ==========
+        name: string
+            Future function's name, must be a valid C identifier
+        to_return: list, Matrix or tuple of them
+            Determins the shape of the output and symbols inside it
+        args: list, Matrix or tuple of them
+            Determins the shape of the input and symbols
+            names to assigned
+        params: dict, optional
+            Numerical values of the used symbols that are neither
+            in args nor defined in the model.
+        fallback: bool, optional
+            If True, the function made by gen_vec_func is returned
+            when the C code can not be compiled, otherwise
+            ccompile.CompileError is raised
+
+        Notes
+        =====
+        The shared objects are cached in the build folder
+        (see ccompile.compile_source).
+        """
+        params = dict((str(k), float(v)) for k, v in (params or {}).items())
+        key = ('c', name, self.convert_syms(to_return),
+               self.convert_syms(args), tuple(sorted(params.items())),
+               len(self.order_list))
+        if key not in self.vec_funcs:
+            source = ccompile.gen_c_source(self, name, to_return, args, params)
+            try:
+                lib_path = ccompile.compile_source(source)
+                self.vec_funcs[key] = ccompile.load_function(
+                    lib_path, name, args, to_return)
+            except ccompile.CompileError as e:
+                # the failure is cached, the compilation of this model
+                # is not tried again
+                self.vec_funcs[key] = e
+        func = self.vec_funcs[key]
+        if isinstance(func, ccompile.CompileError):
+            if not fallback:
+                raise func
+            return self.gen_vec_func(name, to_return, args, params)
+        return func
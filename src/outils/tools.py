@@ -11,12 +11,13 @@ SYMORO software package.
 """
 
 
-import re
+from functools import lru_cache
 
-from sympy import Matrix
+from sympy import Expr, Matrix, Symbol
 from sympy import Integer
-from sympy import sin, cos
-from sympy import Mul, Add, var
+from sympy import sin, cos, pi
+from sympy import Add, count_ops
+from sympy.core.function import _coeff_isneg
 
 
 ZERO = Integer(0)
@@ -28,6 +29,33 @@ SIMPLE = 'Simple'
 TREE = 'Tree'
 TYPES = [SIMPLE, TREE, CLOSED_LOOP]
 INT_KEYS = ['ant', 'sigma', 'mu']
+# names of the symbols created for each joint
+JOINT_SYM_NAMES = ['C{0}', 'S{0}', 'th{0}', 'r{0}', 'QP{0}', 'QDP{0}',
+                   'GAM{0}', 'k{0}']
+
+_SYMBOLS = {}
+# exact cos and sin of the multiples of pi/4 in [-2*pi, 2*pi]
+_PI_QUARTERS = dict((k*pi/4, (cos(k*pi/4), sin(k*pi/4)))
+                    for k in range(-8, 9))
+
+
+def get_sym(name):
+    """Returns the symbol called name.
+
+    Symbols are interned in a process-wide table, which avoids parsing
+    the name each time as var() does, and does not put the symbol in
+    the namespace of the caller.
+    """
+    try:
+        return _SYMBOLS[name]
+    except KeyError:
+        sym = _SYMBOLS[name] = Symbol(name)
+        return sym
+
+
+for _i in range(33):
+    for _fmt in JOINT_SYM_NAMES:
+        get_sym(_fmt.format(_i))
 
 
 def skew(vec):
@@ -90,49 +118,6 @@ def l2str(list_var, spacing=8):
     return ret_str
 
 
-def find_trig_names(sym, pref=r'', pref_len=0, post=r'', post_len=0):
-    search_res = re.findall(pref + r'[AGm0-9]*' + post, str(sym))
-    if post_len == 0:
-        return set([s[pref_len:] for s in search_res])
-    else:
-        return set([s[pref_len:-post_len] for s in search_res])
-
-
-def get_trig_couple_names(sym):
-    names_s = find_trig_names(sym, r'S', 1)
-    names_c = find_trig_names(sym, r'C', 1)
-    return names_c & names_s
-
-
-def get_max_coef_mul(sym, x_term):
-    k, ex = x_term.as_coeff_Mul()
-    coef = sym / k
-    pow_x = ex.as_powers_dict()
-    pow_c = coef.as_powers_dict()
-    pow_c[-1] = 0
-    for j, pow_j in pow_x.iteritems():
-        num_j = -j
-        if j in pow_c and pow_c[j] >= pow_j:
-            pow_c[j] -= pow_j
-        elif num_j in pow_c and pow_c[num_j] >= pow_j:
-            pow_c[num_j] -= pow_j
-            if pow_j % 2:
-                pow_c[-1] += 1
-        else:
-            return ZERO
-    return Mul.fromiter(c**p for c, p in pow_c.iteritems())
-
-
-def get_max_coef_list(sym, x_term):
-    return [get_max_coef_mul(s, x_term) for s in Add.make_args(sym)]
-
-
-def get_max_coef(sym, x_term):
-    return Add.fromiter(
-        get_max_coef_mul(s, x_term) for s in Add.make_args(sym)
-    )
-
-
 def get_pos_neg(str_term):
     if str_term.find('m') != -1:
         s_split = str_term.split('m')
@@ -176,46 +161,107 @@ def ang_sum(np1, np2, nm1, nm2):
         return np1 + np2 + 'm' + nm1 + nm2
 
 
+def cos_sin(th):
+    """Returns (cos(th), sin(th)). The values for the multiples of
+    pi/4 are read from a table instead of being evaluated by sympy.
+    """
+    try:
+        return _PI_QUARTERS[th]
+    except KeyError:
+        return cos(th), sin(th)
+
+
+def split_right_angle(th):
+    """Splits th into (k*pi/2, rest), with k*pi/2 the constant part
+    of th. Returns None if th has no such constant part.
+    """
+    if not isinstance(th, Add):
+        return None
+    const, rest = th.as_independent(*th.free_symbols, as_Add=True)
+    if const == 0 or not rest.free_symbols:
+        return None
+    c, s = cos_sin(const)
+    if not (c.is_Integer and s.is_Integer):
+        return None
+    return const, rest
+
+
 def cos_sin_syms(name):
     if isinstance(name, str) and name[0] == 'm':
-        cos_term, sin_term = var('C{0}, S{0}'.format(name[1:]))
-        return cos_term, -sin_term
+        name = name[1:]
+        return get_sym('C' + name), -get_sym('S' + name)
     else:
-        return var('C{0}, S{0}'.format(name))
+        name = str(name)
+        return get_sym('C' + name), get_sym('S' + name)
 
 
-def sym_less(val_a, val_b):
-    val_a_measure = val_a.count_ops()
-    val_b_measure = val_b.count_ops()
-    return val_a_measure < val_b_measure
-
+@lru_cache(maxsize=8192)
+def _term_ops(term):
+    return term.count_ops()
 
-def get_angles(expr):
-    angles_s = set()
-    for sin_term in expr.atoms(sin):
-        angles_s |= set(sin_term.args)
-    angles_c = set()
-    for cos_term in expr.atoms(cos):
-        angles_c |= set(cos_term.args)
-    return angles_s & angles_c
 
+def op_count(expr):
+    """Number of operations of expr, same value as expr.count_ops().
 
-def cancel_terms(sym, x_term, coef):
-    if coef.is_Add:
-        for arg_c in coef.args:
-            sym = cancel_terms(sym, x_term, arg_c)
-    else:
-        terms = Add.make_args(sym)
-        return Add.fromiter(t for t in terms if t != x_term*coef)
-
+    Notes
+    =====
+    A sum is measured structurally: the number of additions and
+    subtractions plus the cost of each term, which is cached. The
+    candidates compared during a simplification share most of their
+    terms, so only the new terms are actually counted.
+    """
+    if not isinstance(expr, Expr):
+        return 0
+    if not expr.is_Add:
+        return _term_ops(expr)
+    terms = expr.args
+    negs = 0
+    total = len(terms) - 1
+    for term in terms:
+        if _coeff_isneg(term):
+            negs += 1
+            term = -term
+        total += _term_ops(term)
+    if negs == len(terms):
+        # -x - y = NEG + SUB
+        total += 1
+    return total
+
+
+# kinds of operations reported by op_kinds
+OP_KINDS = ('mul', 'add', 'div', 'trig', 'pow', 'other')
+_OP_KIND = {'MUL': 'mul', 'ADD': 'add', 'SUB': 'add', 'NEG': 'add',
+            'DIV': 'div', 'POW': 'pow', 'SIN': 'trig', 'COS': 'trig',
+            'TAN': 'trig', 'COT': 'trig', 'ASIN': 'trig', 'ACOS': 'trig',
+            'ATAN': 'trig', 'ATAN2': 'trig'}
+
+
+@lru_cache(maxsize=8192)
+def _op_kinds(expr):
+    counts = dict.fromkeys(OP_KINDS, 0)
+    for term in Add.make_args(count_ops(expr, visual=True)):
+        coeff, op = term.as_coeff_Mul()
+        if isinstance(op, Symbol):
+            counts[_OP_KIND.get(op.name, 'other')] += int(coeff)
+    return tuple(counts[kind] for kind in OP_KINDS)
+
+
+def op_kinds(expr):
+    """Number of operations of expr by kind: multiplications,
+    additions and subtractions (with negations), divisions,
+    trigonometric functions, powers and other functions.
 
-def trignometric_info(sym):
-    if not sym.has(sin) and not sym.has(cos):
-        short_form = True
-        names = get_trig_couple_names(sym)
-    else:
-        short_form = False
-        names = get_angles(sym)
-    return names, short_form
+    Returns
+    =======
+    counts: dict
+        Keys are the OP_KINDS, the sum of the values is op_count(expr)
+    """
+    if not isinstance(expr, Expr):
+        return dict.fromkeys(OP_KINDS, 0)
+    return dict(zip(OP_KINDS, _op_kinds(expr)))
 
 
+def sym_less(val_a, val_b):
+    if val_a is val_b:
+        return False
+    return op_count(val_a) < op_count(val_b)
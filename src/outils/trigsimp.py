@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+
+# This file is part of the OpenSYMORO project. Please see
+# https://github.com/symoro/symoro/blob/master/LICENCE for the licence.
+
+
+"""
+This module contains the indexed trigonometric simplification engine
+used by the Symbol Manager.
+
+The trigonometric factors of every term of a sum are indexed once, then
+the pairs of terms matching one of the identities
+
+    C**2 + S**2 = 1
+    C1*C2 - S1*S2 = C12         C1*C2 + S1*S2 = C1m2
+    S1*C2 + C1*S2 = S12         S1*C2 - C1*S2 = S1m2
+
+are looked up in the index instead of being searched by trying every
+couple of angle names. Each identity merges two terms into one, so the
+result never has more operations than the input. The C**2 and S**2
+terms with different coefficients are reduced partially, like
+2*a*C**2 + a*S**2 = a + a*C**2; of the two possible forms, the one
+with the fewest operations is kept (see tools.op_count).
+"""
+
+
+import re
+from functools import lru_cache
+from itertools import combinations
+
+from sympy import Add, Symbol
+from sympy import sin, cos
+
+from outils import tools
+
+
+TRIG_SYM = re.compile(r'^([CS])([AGm0-9]+)$')
+
+
+@lru_cache(maxsize=None)
+def _short_trig(sym):
+    """Returns (kind, name) for a symbol like C23 or S1m2, else None"""
+    match = TRIG_SYM.match(sym.name)
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+class _ShortForm(object):
+    """Trigonometric factors written as CX and SX symbols"""
+    @staticmethod
+    def factors(term):
+        res = {}
+        for base, power in term.as_powers_dict().items():
+            if isinstance(base, Symbol) and power.is_Integer and power > 0:
+                info = _short_trig(base)
+                if info is not None:
+                    res[info] = int(power)
+        return res
+
+    @staticmethod
+    def atom(kind, name):
+        return tools.get_sym(kind + name)
+
+    @staticmethod
+    def sort_key(name):
+        return name
+
+    @staticmethod
+    def combined(n1, n2):
+        """Returns (C12, S12), (C1m2, S1m2)"""
+        np1, nm1 = tools.get_pos_neg(n1)
+        np2, nm2 = tools.get_pos_neg(n2)
+        n12 = tools.ang_sum(np1, np2, nm1, nm2)
+        nm12 = tools.ang_sum(np1, nm2, nm1, np2)
+        return tools.cos_sin_syms(n12), tools.cos_sin_syms(nm12)
+
+
+class _LongForm(object):
+    """Trigonometric factors written as cos(x) and sin(x)"""
+    @staticmethod
+    def factors(term):
+        res = {}
+        for base, power in term.as_powers_dict().items():
+            if isinstance(base, (cos, sin)) and power.is_Integer \
+                    and power > 0:
+                kind = 'C' if isinstance(base, cos) else 'S'
+                res[kind, base.args[0]] = int(power)
+        return res
+
+    @staticmethod
+    def atom(kind, angle):
+        return cos(angle) if kind == 'C' else sin(angle)
+
+    @staticmethod
+    def sort_key(angle):
+        return str(angle)
+
+    @staticmethod
+    def combined(n1, n2):
+        return ((cos(n1 + n2), sin(n1 + n2)),
+                (cos(n1 - n2), sin(n1 - n2)))
+
+
+def _form(sym):
+    if sym.has(sin) or sym.has(cos):
+        return _LongForm
+    return _ShortForm
+
+
+class _TermIndex(object):
+    """Terms of a sum with their trigonometric factors"""
+    def __init__(self, sym, form):
+        self.form = form
+        self.terms = list(Add.make_args(sym))
+        self.position = dict((t, i) for i, t in enumerate(self.terms))
+        self.by_base = {}
+        for i, t in enumerate(self.terms):
+            self.by_base.setdefault(t.as_coeff_Mul()[1], []).append(i)
+        self.trig = [form.factors(t) for t in self.terms]
+        self.used = set()
+        self.new_terms = []
+
+    def free(self, i):
+        return i not in self.used
+
+    def find(self, term):
+        """Index of an unused term equal to term, else None"""
+        i = self.position.get(term)
+        if i is None or i in self.used:
+            return None
+        return i
+
+    def find_base(self, base):
+        """Index of an unused term equal to base up to a numerical
+        coefficient, else None"""
+        for i in self.by_base.get(base, ()):
+            if i not in self.used:
+                return i
+        return None
+
+    def merge(self, i1, i2, new_term):
+        self.used |= {i1, i2}
+        self.new_terms.append(new_term)
+
+    def result(self):
+        kept = [t for i, t in enumerate(self.terms) if i not in self.used]
+        return Add(*(kept + self.new_terms))
+
+
+def _c2s2_pass(sym, form):
+    index = _TermIndex(sym, form)
+    for i, term in enumerate(index.terms):
+        for (kind, name), power in index.trig[i].items():
+            if power < 2 or not index.free(i):
+                continue
+            other = 'S' if kind == 'C' else 'C'
+            own_sq = form.atom(kind, name)**2
+            rest = term / own_sq
+            other_sq = form.atom(other, name)**2
+            # c1*b*C**2 + c2*b*S**2 = c2*b + (c1 - c2)*b*C**2
+            #                       = c1*b + (c2 - c1)*b*S**2
+            coeff, base = rest.as_coeff_Mul()
+            j = index.find_base(base*other_sq)
+            if j is not None and j != i:
+                other_coeff = index.terms[j].as_coeff_Mul()[0]
+                new_term = min([
+                    other_coeff*base + (coeff - other_coeff)*base*own_sq,
+                    coeff*base + (other_coeff - coeff)*base*other_sq
+                ], key=tools.op_count)
+                if tools.sym_less(new_term, term + index.terms[j]):
+                    index.merge(i, j, new_term)
+                    continue
+            # rest*C**2 - rest = -rest*S**2
+            j = index.find(-rest)
+            if j is not None and j != i:
+                index.merge(i, j, -rest*other_sq)
+    if not index.used:
+        return sym
+    return index.result()
+
+
+def _cs12_pass(sym, form, defs):
+    index = _TermIndex(sym, form)
+    for i, term in enumerate(index.terms):
+        names = sorted(set(name for kind, name in index.trig[i]),
+                       key=form.sort_key)
+        for n1, n2 in combinations(names, 2):
+            if not index.free(i):
+                break
+            C1, S1 = form.atom('C', n1), form.atom('S', n1)
+            C2, S2 = form.atom('C', n2), form.atom('S', n2)
+            (C12, S12), (C1m2, S1m2) = form.combined(n1, n2)
+            candidates = []
+            if ('C', n1) in index.trig[i] and ('C', n2) in index.trig[i]:
+                candidates.append((C1*C2, S1*S2, C12, C1m2))
+            if ('S', n1) in index.trig[i] and ('C', n2) in index.trig[i]:
+                candidates.append((S1*C2, C1*S2, S1m2, S12))
+            for B, C, A_minus, A_plus in candidates:
+                # for C1*C2 the sum with S1*S2 is C1m2, the
+                # difference is C12; for S1*C2 it is the opposite
+                rest = term / B
+                j = index.find(rest*C)
+                if j is not None and j != i:
+                    index.merge(i, j, rest*A_plus)
+                    defs.append((A_plus, B + C))
+                    break
+                j = index.find(-rest*C)
+                if j is not None and j != i:
+                    index.merge(i, j, rest*A_minus)
+                    defs.append((A_minus, B - C))
+                    break
+    if not index.used:
+        return sym
+    return index.result()
+
+
+def _simp_subterms(func, sym):
+    """Applies func to every sum contained in a non-sum expression"""
+    defs = []
+    repl_dict = {}
+    for term in sym.atoms(Add):
+        repl_dict[term], term_defs = func(term)
+        defs.extend(term_defs)
+    return sym.xreplace(repl_dict), tuple(defs)
+
+
+def _simp_nested(func, sym):
+    """Applies func to the sums nested in the terms of the sum sym"""
+    defs = []
+    args = []
+    for term in sym.args:
+        if not term.is_Atom and term.has(Add):
+            term, term_defs = func(term)
+            defs.extend(term_defs)
+        args.append(term)
+    return Add(*args), defs
+
+
+@lru_cache(maxsize=4096)
+def c2s2_simp(sym):
+    """Simplifies C**2 + S**2 patterns of sym.
+
+    Returns
+    =======
+    sym: expression
+        Simplified expression
+    defs: tuple
+        Always empty, kept for symmetry with cs12_simp
+    """
+    if not sym.is_Add:
+        return _simp_subterms(c2s2_simp, sym)
+    sym, defs = _simp_nested(c2s2_simp, sym)
+    if not sym.is_Add:
+        return sym, ()
+    form = _form(sym)
+    while True:
+        new_sym = _c2s2_pass(sym, form)
+        if new_sym == sym:
+            return sym, ()
+        sym = new_sym
+        if not sym.is_Add:
+            return sym, ()
+
+
+@lru_cache(maxsize=4096)
+def cs12_simp(sym):
+    """Simplifies the sum and difference of angles patterns of sym.
+
+    Returns
+    =======
+    sym: expression
+        Simplified expression
+    defs: tuple of (new_sym, expression) pairs
+        Definitions of the sum and difference symbols that were used,
+        like (C23, C2*C3 - S2*S3)
+    """
+    if not sym.is_Add:
+        return _simp_subterms(cs12_simp, sym)
+    sym, defs = _simp_nested(cs12_simp, sym)
+    if not sym.is_Add:
+        return sym, tuple(defs)
+    form = _form(sym)
+    while True:
+        new_sym = _cs12_pass(sym, form, defs)
+        if new_sym == sym:
+            return sym, tuple(defs)
+        sym = new_sym
+        if not sym.is_Add:
+            return sym, tuple(defs)
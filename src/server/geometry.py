@@ -10,9 +10,12 @@ This module of SYMORO package computes the geometric models.
 """
 
 
-from sympy import Matrix, zeros, eye, sin, cos
+from sympy import Matrix, zeros, eye
 from copy import copy
+from concurrent.futures import ProcessPoolExecutor
 
+from outils import eqstream
+from outils import modelcache
 from outils import symbolmgr
 from outils import tools
 from outils.paramsinit import ParamsInit
@@ -184,39 +187,42 @@ class TransConvolve:
                 self.rot.val += tr.val
                 self.rot.name += tr.name
             else:  # translation
-                self.rot_mat = self.rot_mat * self.rot.rot()
+                _rot_right(self.rot_mat, self.rot.axis, self.rot.val)
                 if self.trig_subs:
                     self.symo.trig_replace(self.rot_mat, self.rot.val,
                                            self.rot.name)
                 self.rot = copy(tr)
         elif tr.type == 1:
-            self.trans += self.rot_mat * self.rot.rot() * tr.trans()
+            col = _rot_right_col(self.rot_mat, self.rot.axis,
+                                 self.rot.val, tr.axis)
+            for k in range(3):
+                self.trans[k] += col[k] * tr.val
             if self.trig_subs:
                 self.symo.trig_replace(self.trans, self.rot.val,
                                        self.rot.name)
 
     def process_left(self, tr):
         if tr.type == 0:  # rotation
-            self.trans = tr.rot() * self.trans
+            _rot_left(self.trans, tr.axis, tr.val)
             if self.trig_subs:
                 self.symo.trig_replace(self.trans, tr.val, tr.name)
             if self.rot.axis == tr.axis:
                 self.rot.val += tr.val
                 self.rot.name += tr.name
             else:  # translation
-                self.rot_mat = self.rot.rot() * self.rot_mat
+                _rot_left(self.rot_mat, self.rot.axis, self.rot.val)
                 if self.trig_subs:
                     self.symo.trig_replace(self.rot_mat, self.rot.val,
                                            self.rot.name)
                 self.rot = copy(tr)
         elif tr.type == 1:
-            self.trans += tr.trans()
+            self.trans[tr.axis] += tr.val
 
     def result(self, direction='right'):
         if direction == 'right':
-            r = self.rot_mat * self.rot.rot()
+            r = _rot_right(self.rot_mat.copy(), self.rot.axis, self.rot.val)
         elif direction == 'left':
-            r = self.rot.rot() * self.rot_mat
+            r = _rot_left(self.rot_mat.copy(), self.rot.axis, self.rot.val)
         if self.trig_subs:
             self.symo.trig_replace(self.trans, self.rot.val, self.rot.name)
             self.symo.trig_replace(r, self.rot.val, self.rot.name)
@@ -224,6 +230,12 @@ class TransConvolve:
                       [0, 0, 0, 1]])
 
 
+def _geom_params(robo, j):
+    """theta, r, alpha, d, gamma, b of frame j with the bound values"""
+    return [robo.geom_param(name, j)
+            for name in ('theta', 'r', 'alpha', 'd', 'gamma', 'b')]
+
+
 def transform_list(robo, i, j):
     """
     Computes the chain of transformations for iTj
@@ -237,20 +249,22 @@ def transform_list(robo, i, j):
     tr_list = []
     for indx in chain1:
         ant = robo.ant[indx]
-        tr_list.append(CompTransf(0, _z, -robo.theta[indx], indx, ant))
-        tr_list.append(CompTransf(1, _z, -robo.r[indx], indx, ant))
-        tr_list.append(CompTransf(0, _x, -robo.alpha[indx], indx, ant, 'A'))
-        tr_list.append(CompTransf(1, _x, -robo.d[indx], indx, ant))
-        tr_list.append(CompTransf(0, _z, -robo.gamma[indx], indx, ant, 'G'))
-        tr_list.append(CompTransf(1, _z, -robo.b[indx], indx, ant))
+        theta, r, alpha, d, gamma, b = _geom_params(robo, indx)
+        tr_list.append(CompTransf(0, _z, -theta, indx, ant))
+        tr_list.append(CompTransf(1, _z, -r, indx, ant))
+        tr_list.append(CompTransf(0, _x, -alpha, indx, ant, 'A'))
+        tr_list.append(CompTransf(1, _x, -d, indx, ant))
+        tr_list.append(CompTransf(0, _z, -gamma, indx, ant, 'G'))
+        tr_list.append(CompTransf(1, _z, -b, indx, ant))
     for indx in chain2:
         ant = robo.ant[indx]
-        tr_list.append(CompTransf(0, _z, robo.gamma[indx], ant, indx, 'G'))
-        tr_list.append(CompTransf(1, _z, robo.b[indx], ant, indx))
-        tr_list.append(CompTransf(0, _x, robo.alpha[indx], ant, indx, 'A'))
-        tr_list.append(CompTransf(1, _x, robo.d[indx], ant, indx))
-        tr_list.append(CompTransf(0, _z, robo.theta[indx], ant, indx))
-        tr_list.append(CompTransf(1, _z, robo.r[indx],  ant, indx))
+        theta, r, alpha, d, gamma, b = _geom_params(robo, indx)
+        tr_list.append(CompTransf(0, _z, gamma, ant, indx, 'G'))
+        tr_list.append(CompTransf(1, _z, b, ant, indx))
+        tr_list.append(CompTransf(0, _x, alpha, ant, indx, 'A'))
+        tr_list.append(CompTransf(1, _x, d, ant, indx))
+        tr_list.append(CompTransf(0, _z, theta, ant, indx))
+        tr_list.append(CompTransf(1, _z, r,  ant, indx))
     return [tr for tr in tr_list if tr.val != 0]
 
 
@@ -306,6 +320,199 @@ def to_matrices_left(tr_list, symo=None, trig_subs=False):
     return res
 
 
+def _inverse_transform(T):
+    """Inverse of the homogeneous transformation matrix T"""
+    R = T[:3, :3].T
+    return Matrix([R.row_join(-R * T[:3, 3]), [0, 0, 0, 1]])
+
+
+def dgm_shared(robo, symo, i, j, cache, trig_subs=True, owner=None):
+    """Computes iTj reusing the transformation matrices of cache.
+
+    iTj is computed as iTk * kTj, where k is the common root of i
+    and j, kTj as kT(ant j) * (ant j)Tj, and iTk as the inverse of kTi.
+    Every intermediate matrix is stored in cache, so the products of
+    a chain shared by several requests are computed once, and jTi is
+    obtained by transposition when iTj is known.
+
+    Parameters
+    ==========
+    symo: symbolmgr.SymbolManager
+        Instance of symbolmgr.SymbolManager. All the substitutions will
+        be put into symo.sydi
+    i: int
+        To-frame index.
+    j: int
+        From-frame index.
+    cache: dict
+        Transformation matrices already computed, keyed by (i, j).
+        The returned matrix is stored in it, so the symbols given to
+        its elements by mat_replace are reused.
+    trig_subs: bool, optional
+        If True, all the sin(x) and cos(x) will be replaced by symbols
+        SX and CX with X=x
+    owner: dict, optional
+        If given, the symbols added to symo while computing a matrix
+        are mapped to its (i, j) key, see GeometricModel
+    """
+    if i == j:
+        return eye(4)
+    if (i, j) in cache:
+        return cache[i, j]
+    k = robo.common_root(i, j)
+    start = len(symo.order_list)
+    if (j, i) in cache:
+        T = _inverse_transform(cache[j, i])
+    elif k == j:
+        T = _inverse_transform(dgm_shared(robo, symo, j, i, cache,
+                                          trig_subs, owner))
+    elif k == i:
+        ant = robo.ant[j]
+        conv = TransConvolve(symo, trig_subs=trig_subs)
+        for tr in transform_list(robo, ant, j):
+            conv.process(tr)
+        T = conv.result()
+        if ant != i:
+            T = dgm_shared(robo, symo, i, ant, cache, trig_subs, owner) * T
+        symo.mat_replace(T, 'T%sT%s' % (i, j), skip=1)
+    else:
+        T = dgm_shared(robo, symo, i, k, cache, trig_subs, owner) * \
+            dgm_shared(robo, symo, k, j, cache, trig_subs, owner)
+        symo.mat_replace(T, 'T%sT%s' % (i, j), skip=1)
+    cache[i, j] = T
+    if owner is not None:
+        # the symbols of the nested matrices already have their owner
+        for s in symo.order_list[start:]:
+            owner.setdefault(s, (i, j))
+    return T
+
+
+class GeometricModel(object):
+    """Direct geometric model that is regenerated incrementally
+    when the geometric parameters of the robot change.
+
+    The matrices are computed by dgm_shared. Every symbol of the
+    model belongs to the matrix whose computation added it, so when
+    some frames change (see Robot.changed_frames), only the matrices
+    whose chain contains them are removed from the symbol table with
+    the symbols depending on them, and computed again.
+    """
+    def __init__(self, robo, frames, trig_subs=True):
+        """
+        Parameters
+        ==========
+        robo: Robot
+            Instance of robot description container
+        frames: list of tuples of type (i,j)
+            Defines list of required transformation matrices iTj
+        trig_subs: bool, optional
+            If True, all the sin(x) and cos(x) will be replaced by
+            symbols SX and CX
+        """
+        self.robo = robo
+        self.frames = list(frames)
+        self.trig_subs = trig_subs
+        self.symo = symbolmgr.SymbolManager(None)
+        """Symbol table of the model"""
+        self.cache = {}
+        """Matrices computed by dgm_shared, keyed by (i, j)"""
+        self.owner = {}
+        """(i, j) key of the matrix that added each symbol"""
+        self.paths = {}
+        """Frames of the chain of each matrix when it was computed"""
+        self.matrices = {}
+        """Requested matrices, their elements are symbols"""
+        robo.clear_changes()
+        self._generate()
+
+    def _path(self, i, j):
+        k = self.robo.common_root(i, j)
+        return frozenset(self.robo.chain(i, k) + self.robo.chain(j, k))
+
+    def _generate(self):
+        symo = self.symo
+        for i, j in self.frames:
+            if (i, j) in self.matrices:
+                continue
+            start = len(symo.order_list)
+            T = dgm_shared(self.robo, symo, i, j, self.cache,
+                           self.trig_subs, self.owner)
+            symo.mat_replace(T, 'T%sT%s' % (i, j), forced=True, skip=1)
+            for s in symo.order_list[start:]:
+                self.owner.setdefault(s, (i, j))
+            self.matrices[i, j] = T
+        for key in self.cache:
+            if key not in self.paths:
+                self.paths[key] = self._path(*key)
+
+    def _stale(self, frames):
+        """Keys of the matrices and symbols that depend on frames"""
+        symo = self.symo
+        keys = set(key for key, path in self.paths.items() if path & frames)
+        syms = set()
+        while True:
+            new_syms = set(s for s, key in self.owner.items()
+                           if key in keys) - syms
+            bad = syms | new_syms
+            for s in symo.order_list:
+                if s not in bad and symo.deps[s] & bad:
+                    new_syms.add(s)
+                    bad.add(s)
+            if not new_syms:
+                return keys, syms
+            syms |= new_syms
+            keys |= set(self.owner[s] for s in new_syms)
+            # inverse matrices do not own symbols
+            keys |= set(key for key, T in self.cache.items()
+                        if T.free_symbols & new_syms)
+
+    def update(self):
+        """Regenerates the matrices that depend on the frames changed
+        since the last update
+
+        Returns
+        =======
+        keys: set of tuples (i, j)
+            The matrices that have been computed again
+        """
+        frames = self.robo.changed_frames()
+        self.robo.clear_changes()
+        if not frames:
+            return set()
+        keys, syms = self._stale(frames)
+        symo = self.symo
+        for s in syms:
+            val = symo.sydi.pop(s)
+            if symo.revdi.get(val) == s:
+                del symo.revdi[val]
+            del self.owner[s]
+        symo.order_list = [s for s in symo.order_list if s not in syms]
+        symo.unfolded = {}
+        symo.rebuild_index()
+        for key in keys:
+            self.cache.pop(key, None)
+            self.paths.pop(key, None)
+            self.matrices.pop(key, None)
+        self._generate()
+        return keys
+
+    def write(self):
+        """Writes the model to the _trm output file of the robot
+
+        Returns
+        =======
+        symo: symbolmgr.SymbolManager
+            The symbol table of the model, its file_out holds the text
+        """
+        symo = self.symo
+        symo.file_open(self.robo, 'trm', keep_text=True)
+        symo.write_params_table(self.robo, 'Direct Geometric model')
+        symo.write_equations()
+        symo.write_line()
+        symo.file_close()
+        return symo
+
+
 def dgm(robo, symo, i, j, key='one', fast_form=True,
         trig_subs=True, forced=False):
     """must be the final DGM function
@@ -363,16 +570,16 @@ def _transform(robo, j, invert=False):
         Transformation matrix. If invert is True then j_T_ant,
         else ant_T_j.
     """
+    theta, r, alpha, d, gamma, b = _geom_params(robo, j)
     if not invert:
-        R1 = _rot_trans(2, robo.gamma[j], robo.b[j])
-        R2 = _rot_trans(0, robo.alpha[j], robo.d[j])
-        R3 = _rot_trans(2, robo.theta[j], robo.r[j])
-        return R1*R2*R3
+        T = _rot_trans(2, gamma, b)
+        _rot_trans_right(T, 0, alpha, d)
+        _rot_trans_right(T, 2, theta, r)
     else:
-        R1 = _rot_trans(2, -robo.gamma[j], -robo.b[j])
-        R2 = _rot_trans(0, -robo.alpha[j], -robo.d[j])
-        R3 = _rot_trans(2, -robo.theta[j], -robo.r[j])
-        return R3*R2*R1
+        T = _rot_trans(2, -theta, -r)
+        _rot_trans_right(T, 0, -alpha, -d)
+        _rot_trans_right(T, 2, -gamma, -b)
+    return T
 
 
 def compute_transform(robo, symo, j, antRj, antPj):
@@ -420,17 +627,18 @@ def _rot(axis=2, th=0):
     rot: Matrix 3x3
     """
     assert axis in {0, 1, 2}
+    c, s = tools.cos_sin(th)
     if axis == 0:
         return Matrix([[1, 0, 0],
-                       [0, cos(th), - sin(th)],
-                       [0, sin(th), cos(th)]])
+                       [0, c, -s],
+                       [0, s, c]])
     elif axis == 1:
-        return Matrix([[cos(th), 0, sin(th)],
+        return Matrix([[c, 0, s],
                        [0, 1, 0],
-                       [-sin(th), 0, cos(th)]])
+                       [-s, 0, c]])
     else:
-        return Matrix([[cos(th), - sin(th), 0],
-                       [sin(th), cos(th), 0],
+        return Matrix([[c, -s, 0],
+                       [s, c, 0],
                        [0, 0, 1]])
 
 
@@ -476,6 +684,89 @@ def _rot_trans(axis=2, th=0, p=0):
                    [0, 0, 0, 1]])
 
 
+# the two coordinates changed by a rotation about each axis
+_ROT_PLANE = {0: (1, 2), 1: (2, 0), 2: (0, 1)}
+
+
+def _rot_right(M, axis=2, th=0):
+    """Multiplies M in place from the right by _rot(axis, th).
+    Only the two columns orthogonal to axis are updated.
+
+    Parameters
+    ==========
+    M: Matrix with 3 columns or 4x4 Matrix
+        The last column of a 4x4 matrix is left unchanged
+
+    Returns
+    =======
+    M: Matrix
+    """
+    if th == 0:
+        return M
+    a, b = _ROT_PLANE[axis]
+    c, s = tools.cos_sin(th)
+    for k in range(M.shape[0]):
+        M[k, a], M[k, b] = _plane_rot(M[k, a], M[k, b], c, s)
+    return M
+
+
+def _plane_rot(x, y, c, s):
+    """Returns (x*c + y*s, y*c - x*s). For the multiples of pi/2,
+    where c and s are 0 or +-1, this is a signed permutation.
+    """
+    if s == 0:
+        if c == 1:
+            return x, y
+        return -x, -y
+    elif c == 0:
+        return y*s, -x*s
+    return x*c + y*s, y*c - x*s
+
+
+def _rot_right_col(M, axis, th, col):
+    """Returns the column col of M * _rot(axis, th) as a list,
+    without computing the product
+    """
+    a, b = _ROT_PLANE[axis]
+    if th == 0 or col == axis:
+        return [M[k, col] for k in range(M.shape[0])]
+    c, s = tools.cos_sin(th)
+    res = [_plane_rot(M[k, a], M[k, b], c, s) for k in range(M.shape[0])]
+    return [r[0] if col == a else r[1] for r in res]
+
+
+def _rot_left(M, axis=2, th=0):
+    """Multiplies M in place from the left by _rot(axis, th).
+    Only the two rows orthogonal to axis are updated.
+
+    Parameters
+    ==========
+    M: Matrix with 3 rows
+
+    Returns
+    =======
+    M: Matrix
+    """
+    if th == 0:
+        return M
+    a, b = _ROT_PLANE[axis]
+    c, s = tools.cos_sin(th)
+    s = -s
+    for k in range(M.shape[1]):
+        M[a, k], M[b, k] = _plane_rot(M[a, k], M[b, k], c, s)
+    return M
+
+
+def _rot_trans_right(T, axis=2, th=0, p=0):
+    """Multiplies the 4x4 matrix T in place from the right
+    by _rot_trans(axis, th, p)
+    """
+    if p != 0:
+        for k in range(4):
+            T[k, 3] += T[k, axis] * p
+    return _rot_right(T, axis, th)
+
+
 def compute_rot_trans(robo, symo):
     #init transformation
     antRj = ParamsInit.init_mat(robo)
@@ -511,7 +802,86 @@ def direct_geometric_fast(robo, i, j):
     return symo
 
 
-def direct_geometric(robo, frames, trig_subs):
+def dgm_options():
+    """Returns the list of the distinct combinations of the dgm options
+    key, fast_form and trig_subs. fast_form is only used with
+    key='one', and the fast form always does the trigonometric
+    substitutions.
+    """
+    options = [dict(key='one', fast_form=True, trig_subs=True)]
+    for key in ('one', 'left', 'right'):
+        for trig_subs in (True, False):
+            options.append(dict(key=key, fast_form=False,
+                                trig_subs=trig_subs))
+    return options
+
+
+def _dgm_matrix(robo, symo, i, j, options):
+    """Computes iTj with the dgm options"""
+    T = dgm(robo, symo, i, j, **options)
+    if isinstance(T, dict):
+        T = T[i, j]
+    return T
+
+
+def tune_dgm(robo, i, j):
+    """Tries all the dgm options for iTj and finds the cheapest one.
+
+    Parameters
+    ==========
+    robo: Robot
+        Instance of robot description container
+    i: int
+        To-frame index.
+    j: int
+        From-frame index.
+
+    Returns
+    =======
+    options: dict
+        The cheapest dgm options (key, fast_form, trig_subs)
+    table: list of tuples (options, ops)
+        Number of operations of the equations needed to compute
+        iTj, for each combination of options
+    """
+    table = []
+    for options in dgm_options():
+        symo = symbolmgr.SymbolManager(None)
+        T = _dgm_matrix(robo, symo, i, j, options)
+        table.append((options, symo.model_ops(T)))
+    best = min(table, key=lambda item: item[1])
+    return best[0], table
+
+
+def _dgm_worker(args):
+    """Computes iTj in a private symbol manager (process pool task)"""
+    robo, i, j, options = args
+    symo = symbolmgr.SymbolManager(None)
+    T = _dgm_matrix(robo, symo, i, j, options)
+    symo.mat_replace(T, 'T%sT%s' % (i, j), forced=True, skip=1)
+    return symo, T
+
+
+def _write_frames(symo, frames, outputs):
+    """Writes all the equations of symo, the header of each iTj of
+    frames before the first equation of its elements"""
+    heads = {}
+    for (i, j), T in zip(frames, outputs):
+        positions = [symo.position[s] for s in symo.extract_syms(T)
+                     if s in symo.position]
+        if positions:
+            heads.setdefault(min(positions), []).append((i, j))
+    for n, s in enumerate(symo.order_list):
+        for i, j in heads.get(n, ()):
+            symo.write_line('Tramsformation matrix %s T %s' % (i, j))
+        symo.write_equation(s, symo.sydi[s])
+        if n + 1 in heads:
+            symo.write_line()
+
+
+def direct_geometric(robo, frames, trig_subs, cse=False, use_cache=False,
+                     processes=None, tune=False, shared=False,
+                     optimize=False, stream=False):
     """Computes trensformation matrix iTj.
 
     Parameters
@@ -523,82 +893,300 @@ def direct_geometric(robo, frames, trig_subs):
     trig_subs: bool, optional
         If True, all the sin(x) and cos(x) will be replaced by symbols
         SX and CX with adding them to the dictionary
+    cse: bool, optional
+        If True, the common subexpressions of the whole model are
+        replaced by shared symbols before the equations are written
+    use_cache: bool, optional
+        If True, the model is loaded from the model cache when the
+        same robot has already been computed with the same options
+    processes: int, optional
+        If given, the transformation matrices are computed in a pool
+        of that many processes, then merged in the order of frames
+    tune: bool, optional
+        If True, each iTj is computed with the dgm options that give
+        the fewest operations (see tune_dgm), and the operation
+        count of every option is written in the output
+    shared: bool, optional
+        If True, the products of the chains shared by several frame
+        pairs are computed once and inverse pairs are obtained by
+        transposition (see dgm_shared). Can not be combined with
+        processes or tune.
+    optimize: bool, optional
+        If True, the constants and aliases are propagated, and only
+        the equations needed by the transformation matrices are
+        written (see SymbolManager.optimize)
+    stream: bool, optional
+        If True, the equations are also written as NDJSON records to
+        the _trm.ndjson file of the robot (see outils.eqstream)
 
     Returns
     =======
     symo: symbolmgr.SymbolManager
         Instance that contains all the relations of the computed model
     """
+    frames = list(frames)
+    if shared and (processes is not None or tune):
+        raise ValueError("shared can not be combined with processes or tune")
+    if use_cache:
+        key = modelcache.make_key(robo, 'trm', frames=frames,
+                                  trig_subs=trig_subs, cse=cse, tune=tune,
+                                  shared=shared, optimize=optimize)
+        cached = modelcache.load_model(key, robo, 'trm')
+        if cached is not None:
+            if stream:
+                eqstream.dump(cached[0], eqstream.get_stream_path(robo, 'trm'))
+            return cached[0]
     symo = symbolmgr.SymbolManager()
-    symo.file_open(robo, 'trm')
+    symo.file_open(robo, 'trm', stream=stream, keep_text=use_cache)
     symo.write_params_table(robo, 'Direct Geometric model')
+    outputs = []
+    frame_options = []
     for i, j in frames:
-        symo.write_line('Tramsformation matrix %s T %s' % (i, j))
-        T = dgm(robo, symo, i, j)
-        symo.mat_replace(T, 'T%sT%s' % (i, j), forced=True, skip=1)
+        if not tune:
+            frame_options.append({})
+            continue
+        options, table = tune_dgm(robo, i, j)
+        frame_options.append(options)
+        symo.write_line('Options of %s T %s (key, fast_form, trig_subs, ops)'
+                        % (i, j))
+        for opt, ops in table:
+            symo.write_line(tools.l2str([opt['key'], opt['fast_form'],
+                                         opt['trig_subs'], ops], 12))
+        symo.write_line()
+    if cse or optimize:
+        # equations are written once the whole model is known
+        file_out, symo.file_out = symo.file_out, None
+    if shared:
+        cache = {}
+        for i, j in frames:
+            symo.write_line('Tramsformation matrix %s T %s' % (i, j))
+            T = dgm_shared(robo, symo, i, j, cache, trig_subs)
+            symo.mat_replace(T, 'T%sT%s' % (i, j), forced=True, skip=1)
+            outputs.append(T.copy())
+            symo.write_line()
+    elif processes is None:
+        for (i, j), options in zip(frames, frame_options):
+            symo.write_line('Tramsformation matrix %s T %s' % (i, j))
+            T = _dgm_matrix(robo, symo, i, j, options)
+            symo.mat_replace(T, 'T%sT%s' % (i, j), forced=True, skip=1)
+            outputs.append(T)
+            symo.write_line()
+    else:
+        tasks = [(robo, i, j, options)
+                 for (i, j), options in zip(frames, frame_options)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = pool.map(_dgm_worker, tasks)
+            for (i, j), (frame_symo, T) in zip(frames, results):
+                symo.write_line('Tramsformation matrix %s T %s' % (i, j))
+                renames = symo.merge(frame_symo)
+                outputs.append(T.xreplace(renames))
+                symo.write_line()
+    if cse or optimize:
+        symo.file_out = file_out
+        if cse:
+            symo.eliminate_common_subexpressions()
+        if optimize:
+            symo.optimize(outputs)
+        _write_frames(symo, frames, outputs)
         symo.write_line()
     symo.file_close()
+    if use_cache:
+        modelcache.save_model(key, symo)
     return symo
-def compute_geometric_jacobian(robo, ee_frame=None):
-    """Calcule le Jacobien géométrique 6x(NJ-1)."""
+def compute_geometric_jacobian(robo, ee_frame=None, use_cache=False,
+                               symo=None, optimize=False):
+    """Calcule le Jacobien géométrique 6x(NJ-1) exprimé dans le repère 0.
 
-    # Effecteur = dernier frame si non spécifié
-    if ee_frame is None:
-        ee_frame = robo.NF - 1
-
-    # Calcul FK pour chaque frame via DGM SYMORO
-    symo = symbolmgr.SymbolManager()
-    T0i = {}
+    Les transformations 0Tj sont calculées de proche en proche,
+    0Tj = 0T(ant j) * (ant j)Tj, à partir de antRj et antPj donnés par
+    compute_rot_trans (voir jacobian_in_frame). La colonne de
+    l'articulation j utilise l'axe z_j et l'origine O_j (convention DH
+    modifiée).
 
-    for i in range(robo.NF):
-        T0i[i] = dgm(robo, symo, i, 0, fast_form=True)
+    Parameters
+    ==========
+    robo: Robot
+        Instance of robot description container
+    ee_frame: int, optional
+        Frame of the end effector, the last frame by default
+    use_cache: bool, optional
+        If True, the model is loaded from the model cache when the
+        same robot has already been computed
+    symo: symbolmgr.SymbolManager, optional
+        Manager that receives the relations of the model. If not
+        given, they are written to the _jac output file.
+    optimize: bool, optional
+        If True and symo is not given, only the equations needed by
+        J are written, after constant and alias propagation (see
+        SymbolManager.optimize)
 
-    # Extraction des origines et axes z
-    o = {}
-    z = {}
+    Returns
+    =======
+    J: Matrix 6x(NJ-1)
+        Its elements use the intermediate symbols of symo, use
+        symo.mat_unfold to express them in the joint variables
+    """
+    if ee_frame is None:
+        ee_frame = robo.NF - 1
+    own_symo = symo is None
+    if use_cache and own_symo:
+        key = modelcache.make_key(robo, 'jac', ee_frame=ee_frame,
+                                  optimize=optimize)
+        cached = modelcache.load_model(key, robo, 'jac')
+        if cached is not None:
+            return cached[1]
+    if own_symo:
+        symo = symbolmgr.SymbolManager()
+        symo.file_open(robo, 'jac', keep_text=use_cache)
+        symo.write_params_table(robo, 'Geometric Jacobian')
+        if optimize:
+            file_out, symo.file_out = symo.file_out, None
+    J = jacobian_in_frame(robo, symo, 0, ee_frame)[0]
+    if own_symo:
+        if optimize:
+            symo.file_out = file_out
+            symo.optimize(J)
+            symo.write_equations()
+            symo.write_line()
+        symo.file_close()
+        if use_cache:
+            modelcache.save_model(key, symo, J)
+    return J
 
-    for i in range(robo.NF):
-        T = T0i[i]
-        o[i] = Transform.P(T)
-        R = Transform.R(T)
-        z[i] = R[:, 2]   # axe z_i
 
-    o_n = o[ee_frame]
+def jacobian_in_frame(robo, symo, k, ee_frame=None, antRj=None, antPj=None):
+    """Computes the geometric Jacobian of ee_frame projected in frame k,
+    which must be 0 or a frame of robo.chain(ee_frame).
 
-    # Jacobien 6x(NJ-1)
-    n_joints = robo.NJ - 1
-    J = zeros(6, n_joints)
+    Parameters
+    ==========
+    robo: Robot
+        Instance of robot description container
+    symo: symbolmgr.SymbolManager
+        Receives the relations of the model
+    k: int
+        Projection frame
+    ee_frame: int, optional
+        Frame of the end effector, the last frame by default
+    antRj, antPj: lists, optional
+        Result of compute_rot_trans, computed if not given
 
-    # Contribution de chaque articulation
-    for i in range(1, n_joints + 1):
-        parent = robo.ant[i]
-        z_im1 = z[parent]
-        o_im1 = o[parent]
+    Returns
+    =======
+    J: Matrix 6x(NJ-1)
+        kJ, the columns of the joints out of the chain are zero
+    kR0: Matrix 3x3
+        Rotation from frame 0 to frame k, 0J = diag(kR0.T, kR0.T) * kJ
+    """
+    if ee_frame is None:
+        ee_frame = robo.NF - 1
+    if antRj is None:
+        antRj, antPj = compute_rot_trans(robo, symo)
+        for j in range(robo.NL, robo.NF):
+            antRj.append(None)
+            antPj.append(None)
+            compute_transform(robo, symo, j, antRj, antPj)
+    path = [0] + list(reversed(robo.chain(ee_frame)))
+    pos = path.index(k)
+    R = {k: eye(3)}
+    P = {k: zeros(3, 1)}
+    # frames after k: kTj = kT(ant j) * (ant j)Tj
+    for j in path[pos + 1:]:
+        ant = robo.ant[j]
+        T = Matrix([(R[ant] * antRj[j]).row_join(R[ant]*antPj[j] + P[ant]),
+                    [0, 0, 0, 1]])
+        T = symo.mat_replace(T, 'T%sT%s' % (k, j), skip=1)
+        R[j], P[j] = Transform.R(T), Transform.P(T)
+    # frames before k: kT(ant j) = kTj * jT(ant j)
+    for j in reversed(path[1:pos + 1]):
+        ant = robo.ant[j]
+        kRant = R[j] * antRj[j].T
+        T = Matrix([kRant.row_join(P[j] - kRant * antPj[j]), [0, 0, 0, 1]])
+        T = symo.mat_replace(T, 'T%sT%s' % (k, ant), skip=1)
+        R[ant], P[ant] = Transform.R(T), Transform.P(T)
+    J = zeros(6, robo.NJ - 1)
+    for j in path[1:]:
+        if j >= robo.NJ:
+            continue
+        z_j = R[j][:, 2]
+        if robo.sigma[j] == 0:
+            J[:3, j - 1] = z_j.cross(P[ee_frame] - P[j])
+            J[3:, j - 1] = z_j
+        elif robo.sigma[j] == 1:
+            J[:3, j - 1] = z_j
+    J = symo.mat_replace(J, 'J%s' % k)
+    return J, R[0]
+
+
+def optimal_jacobian_frame(robo, ee_frame=None):
+    """Finds the projection frame where the geometric Jacobian
+    is the cheapest to compute, and writes it in the _jac output.
+
+    The cost of a frame k is the number of operations of kJ plus
+    the ones needed to rotate the twist back to frame 0: kR0 and
+    two products of a 3x3 matrix by a vector.
 
-        # Rotationnel
-        if int(robo.sigma[i]) == 0:
-            Jv = z_im1.cross(o_n - o_im1)
-            Jw = z_im1
-        # Prismatique
-        else:
-            Jv = z_im1
-            Jw = Matrix([0, 0, 0])
+    Parameters
+    ==========
+    robo: Robot
+        Instance of robot description container
+    ee_frame: int, optional
+        Frame of the end effector, the last frame by default
 
-        J[:3, i - 1] = Jv
-        J[3:, i - 1] = Jw
+    Returns
+    =======
+    k: int
+        Best projection frame
+    J: Matrix 6x(NJ-1)
+        kJ
+    kR0: Matrix 3x3
+        Rotation from frame 0 to frame k
+    costs: list of tuples (k, jacobian ops, rotation ops)
+        Cost of every candidate frame
+    """
+    if ee_frame is None:
+        ee_frame = robo.NF - 1
+    costs = []
+    best = None
+    for k in [0] + list(reversed(robo.chain(ee_frame))):
+        frame_symo = symbolmgr.SymbolManager(None)
+        J, kR0 = jacobian_in_frame(robo, frame_symo, k, ee_frame)
+        jac_ops = frame_symo.model_ops(J)
+        rot_ops = 0
+        if k != 0:
+            # kR0 equations not shared with kJ, then 2 * (9 mul + 6 add)
+            rot_ops = frame_symo.model_ops([J, kR0]) - jac_ops + 30
+        costs.append((k, jac_ops, rot_ops))
+        if best is None or jac_ops + rot_ops < best[0]:
+            best = (jac_ops + rot_ops, k, frame_symo, J, kR0)
+    _, k, frame_symo, J, kR0 = best
+    symo = symbolmgr.SymbolManager()
+    symo.file_open(robo, 'jac')
+    symo.write_params_table(robo, 'Geometric Jacobian')
+    symo.write_line('Projection frame costs (frame, jacobian, rotation)')
+    for cost in costs:
+        symo.write_line(tools.l2str(cost))
+    symo.write_line()
+    symo.write_line('Jacobian projected in frame %s' % k)
+    symo.merge(frame_symo)
+    symo.write_line()
+    symo.file_close()
+    return k, J, kR0, costs
 
-    return J
 
 def direct_kinematic(robo, qdot, ee_frame=None):
     """
     Modèle Cinématique Direct : twist = J(q) * qdot
-    Retourne : (Jacobien, Twist)
+    Retourne : (Jacobien, Twist), exprimés en fonction des variables
+    articulaires
     """
     if ee_frame is None:
         ee_frame = robo.NF - 1
 
-    # Jacobien
-    J = compute_geometric_jacobian(robo, ee_frame)
+    # Jacobien, les symboles intermédiaires sont développés
+    symo = symbolmgr.SymbolManager(None)
+    J = compute_geometric_jacobian(robo, ee_frame, symo=symo)
+    J = symo.mat_unfold(Matrix(J))
 
     # Convertir qdot en vecteur sympy
     if not isinstance(qdot, Matrix):
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+
+# This file is part of the OpenSYMORO project. Please see
+# https://github.com/symoro/symoro/blob/master/LICENCE for the licence.
+
+
+"""
+This module of SYMORO package computes the direct geometric model
+numerically, for a batch of joint configurations at once.
+"""
+
+
+import numpy as np
+from sympy import Symbol, lambdify, sympify
+
+
+GEOM_KEYS = ('gamma', 'b', 'alpha', 'd', 'theta', 'r')
+
+
+class NumericGeometric(object):
+    """Vectorized direct geometric model built from the DH arrays
+    of a Robot. The symbolic parameters are compiled once, then
+    every call evaluates all the frames for N configurations.
+    """
+    def __init__(self, robo, params=None):
+        """
+        Parameters
+        ==========
+        robo: Robot
+            Instance of robot description container
+        params: dict, optional
+            Numerical values of the geometric constants (D3, RL4...).
+            Keys can be symbols or symbol names. The values bound
+            with robo.bind are used for the other constants.
+        """
+        self.NF = robo.NF
+        self.ant = list(robo.ant)
+        self.q_syms = list(robo.q_vec)
+        for q in self.q_syms:
+            if not isinstance(q, Symbol):
+                raise ValueError("Joint variable %s is not a symbol" % q)
+        values = dict(robo.constants)
+        values.update(params or {})
+        subs_dict = {}
+        for key, val in values.items():
+            if isinstance(key, str):
+                key = Symbol(key)
+            subs_dict[key] = sympify(val)
+        exprs = []
+        for j in range(self.NF):
+            for name in GEOM_KEYS:
+                val = sympify(getattr(robo, name)[j])
+                exprs.append(val.xreplace(subs_dict))
+        free = set().union(*(e.free_symbols for e in exprs))
+        missing = free - set(self.q_syms)
+        if missing:
+            raise ValueError(
+                "Missing numerical values for %s"
+                % ', '.join(sorted(str(s) for s in missing))
+            )
+        self._dh_func = lambdify(self.q_syms, exprs, 'numpy')
+        # frames sorted so that ant[j] is always computed before j
+        self._order = sorted(range(1, self.NF),
+                             key=lambda j: len(robo.chain(j)))
+
+    def dh_values(self, q):
+        """Evaluates the DH parameters of every frame.
+
+        Parameters
+        ==========
+        q: array (N, nq)
+            Joint values, columns ordered as robo.q_vec
+
+        Returns
+        =======
+        dh_values: array (6, NF, N)
+            gamma, b, alpha, d, theta, r for each frame
+        """
+        q = np.atleast_2d(np.asarray(q, dtype=float))
+        if q.shape[1] != len(self.q_syms):
+            raise ValueError(
+                "Expected %d joint values, got %d"
+                % (len(self.q_syms), q.shape[1])
+            )
+        vals = self._dh_func(*q.T)
+        res = np.empty((len(vals), q.shape[0]))
+        for k, val in enumerate(vals):
+            res[k] = val
+        return res.reshape(self.NF, len(GEOM_KEYS), -1).transpose(1, 0, 2)
+
+    def __call__(self, q):
+        """Computes the poses 0Tj of all the frames.
+
+        Parameters
+        ==========
+        q: array (N, nq) or (nq,)
+            Joint values, columns ordered as robo.q_vec
+
+        Returns
+        =======
+        T: array (N, NF, 4, 4)
+            Homogeneous transformation matrices 0Tj
+        """
+        # parameters arranged as (N, NF) to get antTj as (N, NF, 4, 4)
+        antTj = transform_batch(*(p.T for p in self.dh_values(q)))
+        num = antTj.shape[0]
+        T = np.empty((num, self.NF, 4, 4))
+        T[:, 0] = np.eye(4)
+        for j in self._order:
+            T[:, j] = np.matmul(T[:, self.ant[j]], antTj[:, j])
+        return T
+
+
+def transform_batch(gamma, b, alpha, d, theta, r):
+    """Numerical counterpart of transform.get_transformation_matrix.
+
+    Parameters
+    ==========
+    gamma, b, alpha, d, theta, r: arrays of the same shape S
+
+    Returns
+    =======
+    T: array S + (4, 4)
+        Transformation matrices ant_T_j
+    """
+    c_gamma, s_gamma = np.cos(gamma), np.sin(gamma)
+    c_alpha, s_alpha = np.cos(alpha), np.sin(alpha)
+    c_theta, s_theta = np.cos(theta), np.sin(theta)
+    sg_ca = s_gamma * c_alpha
+    sg_sa = s_gamma * s_alpha
+    cg_ca = c_gamma * c_alpha
+    cg_sa = c_gamma * s_alpha
+    T = np.zeros(np.shape(theta) + (4, 4))
+    T[..., 0, 0] = c_gamma * c_theta - sg_ca * s_theta
+    T[..., 0, 1] = -c_gamma * s_theta - sg_ca * c_theta
+    T[..., 0, 2] = sg_sa
+    T[..., 0, 3] = d * c_gamma + r * sg_sa
+    T[..., 1, 0] = s_gamma * c_theta + cg_ca * s_theta
+    T[..., 1, 1] = -s_gamma * s_theta + cg_ca * c_theta
+    T[..., 1, 2] = -cg_sa
+    T[..., 1, 3] = d * s_gamma - r * cg_sa
+    T[..., 2, 0] = s_alpha * s_theta
+    T[..., 2, 1] = s_alpha * c_theta
+    T[..., 2, 2] = c_alpha
+    T[..., 2, 3] = r * c_alpha + b
+    T[..., 3, 3] = 1.
+    return T
+
+
+def direct_geometric_batch(robo, q, params=None):
+    """Computes the poses 0Tj of all the frames for N configurations.
+
+    Parameters
+    ==========
+    robo: Robot
+        Instance of robot description container
+    q: array (N, nq)
+        Joint values, columns ordered as robo.q_vec
+    params: dict, optional
+        Numerical values of the geometric constants
+
+    Returns
+    =======
+    T: array (N, NF, 4, 4)
+    """
+    return NumericGeometric(robo, params)(q)
@@ -18,16 +18,52 @@ from itertools import combinations
 
 from sympy import sin, cos, sign, pi
 from sympy import Symbol, Matrix, Expr, Integer
-from sympy import Mul, Add, factor, zeros, var, sympify, eye
+from sympy import Mul, Add, factor, zeros, sympify, eye
 
 from server import baseparams
 from outils import filemgr
+from outils import modelcache
 from outils import symbolmgr
 from outils import tools
 from outils.tools import ZERO, ONE, FAIL, OK
 from outils.tools import CLOSED_LOOP, SIMPLE, TREE, TYPES, INT_KEYS
 
 
+class _AntList(list):
+    """List of antecedent frames that resets the ancestor index of its
+    robot whenever it is modified"""
+    def __init__(self, iterable=(), owner=None):
+        list.__init__(self, iterable)
+        self.owner = owner
+
+    def _changed(self):
+        # owner is not set yet while the list is unpickled
+        owner = getattr(self, 'owner', None)
+        if owner is not None:
+            owner._ancestors = None
+
+    def __reduce_ex__(self, protocol):
+        # the owner sets itself again when the list is assigned to it
+        return (_AntList, (list(self),))
+
+
+def _notify(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        res = method(self, *args)
+        self._changed()
+        return res
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'clear',
+              'reverse', 'sort'):
+    setattr(_AntList, _name, _notify(_name))
+
+
 class Robot(object):
     """Container of the robot parametric description.
     Responsible for low-level geometric transformation
@@ -64,7 +100,7 @@ class Robot(object):
         """actuated, if 1, then the joint is actuated"""
         self.mu = [1 for i in range(NF + 1)]
         """  geometrical parameter: list of var"""
-        self.theta = [0] + [var('th%s' % (i+1)) for i in range(NF)]
+        self.theta = [0] + [tools.get_sym('th%s' % (i+1)) for i in range(NF)]
         """  geometrical parameter: list of var"""
         self.r = [0 for i in range(NF + 1)]
         """  geometrical parameter: list of var"""
@@ -94,9 +130,9 @@ class Robot(object):
         """  base linear acceleration: 3x1 matrix"""
         self.vdot0 = zeros(3, 1)
         """  joint speed: list of var"""
-        self.qdot = [var('QP{0}'.format(i)) for i in numj]
+        self.qdot = [tools.get_sym('QP{0}'.format(i)) for i in numj]
         """  joint acceleration: list of var"""
-        self.qddot = [var('QDP{0}'.format(i)) for i in numj]
+        self.qddot = [tools.get_sym('QDP{0}'.format(i)) for i in numj]
 
         self.GAM = [0 for i in range(self.NJ)]
         self.eta = [0 for i in range(self.NF + 1)] 
@@ -127,7 +163,26 @@ class Robot(object):
         
         """  Inertie de l'actuateur (IA)"""
         self.IA = [0 for i in range(self.NF + 1)]
+        """  numerical values bound to geometric constants: dict"""
+        self.constants = {}
+        """  frames whose geometric parameters changed: set of int"""
+        self._changed = set()
        
+    def __setattr__(self, name, value):
+        if name == 'ant':
+            value = _AntList(value, self)
+            object.__setattr__(self, '_ancestors', None)
+            if '_changed' in self.__dict__:
+                self.mark_changed()
+        object.__setattr__(self, name, value)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # a copy keeps the changes of the original, the frames are not
+        # marked again
+        object.__setattr__(self, 'ant', _AntList(self.ant, self))
+        object.__setattr__(self, '_ancestors', None)
+
     def set_par_file_path(self, path=None):
         if path is None or not os.path.isabs(path):
             file_path = filemgr.get_file_path(self)
@@ -179,6 +234,8 @@ class Robot(object):
         ext_head = ext_dynam_head[7:] + ['IA']
         f_ex_head = ext_dynam_head[1:4]
         n_ex_head = ext_dynam_head[4:7]
+        if name in geom_head and self.get_val(j, name) != val:
+            self._changed.add(j)
         if name in ext_head + geom_head + base_vel_head:
             X = getattr(self, name)
             X[j] = val
@@ -199,6 +256,28 @@ class Robot(object):
             self.Z[j] = val
         return OK
 
+    def changed_frames(self):
+        """Frames whose geometric parameters changed since the last
+        call of clear_changes. The changes made through put_val, bind
+        and the assignment of ant are recorded.
+
+        Returns
+        =======
+        changed_frames: set of int
+        """
+        return set(self._changed)
+
+    def mark_changed(self, frames=None):
+        """Records a change of the geometric parameters of frames,
+        of all the frames if frames is None"""
+        if frames is None:
+            frames = range(1, self.NF)
+        self._changed.update(frames)
+
+    def clear_changes(self):
+        """Forgets the recorded changes, once the models are updated"""
+        self._changed.clear()
+
     def get_val(self, j, name):
         geom_head = self.get_geom_head()
         base_vel_head = self.get_base_vel_head()
@@ -249,13 +328,24 @@ class Robot(object):
         else:
             return 0
 
-    def compute_baseparams(self):
+    def compute_baseparams(self, use_cache=False):
         """
         Compute the Base Inertial Parameters of the robot.
-        """
+
+        If use_cache is True, the result is loaded from the model
+        cache when the same robot has already been computed.
+        """
+        if use_cache:
+            key = modelcache.make_key(self, 'regp')
+            cached = modelcache.load_model(key, self, 'regp')
+            if cached is not None:
+                symo, base_robo = cached
+                base_robo.set_directory(self.directory)
+                base_robo.set_par_file_path(filemgr.get_file_path(base_robo))
+                return symo, base_robo
         base_robo = copy.deepcopy(self)
         symo = symbolmgr.SymbolManager()
-        symo.file_open(base_robo, 'regp')
+        symo.file_open(base_robo, 'regp', keep_text=use_cache)
         title = "Base Inertial Parameters equations"
         symo.write_params_table(
             base_robo, title, inert=True, dynam=True
@@ -272,6 +362,8 @@ class Robot(object):
         base_robo.name = base_robo.name + "_base"
         file_path = filemgr.get_file_path(base_robo)
         base_robo.set_par_file_path(file_path)
+        if use_cache:
+            modelcache.save_model(key, symo, base_robo)
         return symo, base_robo
 
     @property
@@ -430,6 +522,61 @@ class Robot(object):
         """
         return self.IA[j] * self.qddot[j]
 
+    def bind(self, values, keep=()):
+        """Binds numerical values to geometric constants like D3, RL4
+
+        The bound symbols are replaced by their values in the geometric
+        parameters read by the geometric models (see geom_param), so the
+        zero terms and the constant rotations are removed before the
+        symbolic generation.
+
+        Parameters
+        ==========
+        values: dict
+            Numerical values, keys can be symbols or symbol names.
+        keep: iterable, optional
+            Symbols or symbol names that stay symbolic, even if they
+            have a value in values or are already bound.
+
+        Returns
+        =======
+        constants: dict
+            All the bound values of the robot, keyed by symbol name
+        """
+        keep = set(str(name) for name in keep)
+        for name, val in values.items():
+            if str(name) not in keep:
+                self.constants[str(name)] = sympify(val)
+        for name in keep:
+            self.constants.pop(name, None)
+        self.mark_changed()
+        return self.constants
+
+    def unbind(self, names=None):
+        """Makes the given constants symbolic again, all if names is None
+        """
+        if names is None:
+            self.constants.clear()
+        for name in names or ():
+            self.constants.pop(str(name), None)
+        self.mark_changed()
+
+    def geom_param(self, name, j):
+        """Geometric parameter of frame j with the bound values
+
+        Parameters
+        ==========
+        name: string
+            One of 'theta', 'r', 'alpha', 'd', 'gamma', 'b'.
+        j: int
+            Frame index.
+        """
+        val = getattr(self, name)[j]
+        if not self.constants or not isinstance(val, Expr):
+            return val
+        return val.xreplace(dict((tools.get_sym(key), v)
+                                 for key, v in self.constants.items()))
+
     def get_angles(self, j):
         """List of non-constant angles of frame j
 
@@ -448,14 +595,43 @@ class Robot(object):
         angs = []
         if j not in range(self.NF):
             return angs
-        if type(self.theta[j]) != int and not self.theta[j].is_number:
-            angs.append((self.theta[j], j))
-        if type(self.alpha[j]) != int and not self.alpha[j].is_number:
-            angs.append((self.alpha[j], 'A%s' % j))
-        if type(self.gamma[j]) != int and not self.gamma[j].is_number:
-            angs.append((self.gamma[j], 'G%s' % j))
+        theta = self.geom_param('theta', j)
+        alpha = self.geom_param('alpha', j)
+        gamma = self.geom_param('gamma', j)
+        if type(theta) != int and not theta.is_number:
+            angs.append((theta, j))
+        if type(alpha) != int and not alpha.is_number:
+            angs.append((alpha, 'A%s' % j))
+        if type(gamma) != int and not gamma.is_number:
+            angs.append((gamma, 'G%s' % j))
         return angs
 
+    def _ancestor_index(self):
+        """Chains from every frame to the base frame, built once and
+        reset whenever ant is modified.
+
+        Returns
+        =======
+        chains: list of tuples
+            chains[j] is the chain(j) of frame j, its length is the
+            depth of the frame.
+        """
+        if self._ancestors is not None:
+            return self._ancestors
+        chains = [None] * len(self.ant)
+        chains[0] = ()
+        for j in range(len(self.ant)):
+            path = []
+            while 0 < j < len(chains) and chains[j] is None:
+                path.append(j)
+                j = self.ant[j]
+            tail = chains[j] if 0 <= j < len(chains) else ()
+            for i in reversed(path):
+                tail = (i,) + tail
+                chains[i] = tail
+        self._ancestors = chains
+        return chains
+
     def chain(self, j, k=0):
         """Chain of antecedent frames between j-th and k-th frames
 
@@ -472,11 +648,15 @@ class Robot(object):
             List of antecedent frames. j is the first index in the list.
             k is not included
         """
-        u = []
-        while j != k and j != 0:
-            u.append(j)
-            j = self.ant[j]
-        return u
+        chains = self._ancestor_index()
+        if j == k or not 0 <= j < len(chains):
+            return []
+        u = chains[j]
+        if 0 <= k < len(chains):
+            n = len(u) - len(chains[k])
+            if 0 < n < len(u) and u[n] == k:
+                return list(u[:n])
+        return list(u)
 
     def loop_chain(self, i, j):
         k = self.common_root(i, j)
@@ -502,11 +682,18 @@ class Robot(object):
             The highest index of the common frame in chains for i and j.
             If they don't have common root, -1
         """
-        u = self.chain(i)
-        while True:
-            if j in u or j == 0:
-                return j
-            j = self.ant[j]
+        chains = self._ancestor_index()
+        u, v = chains[i], chains[j]
+        # ancestors of the same depth are equal up to the common root:
+        # binary search of its depth
+        low, high = 0, min(len(u), len(v))
+        while low < high:
+            mid = (low + high + 1) // 2
+            if u[len(u) - mid] == v[len(v) - mid]:
+                low = mid
+            else:
+                high = mid - 1
+        return u[len(u) - low] if low else 0
 
     def get_inert_param(self, j):
         """Returns 10-vector of inertia paremeters of link j.
@@ -588,14 +775,14 @@ class Robot(object):
                     self.qddot[j] = 0
                     self.GAM[j] = 0
                 else:
-                    self.qdot[j] = var('QP{0}'.format(j))
-                    self.qddot[j] = var('QDP{0}'.format(j))
-                    self.GAM[j] = var('GAM{0}'.format(j))
+                    self.qdot[j] = tools.get_sym('QP{0}'.format(j))
+                    self.qddot[j] = tools.get_sym('QDP{0}'.format(j))
+                    self.GAM[j] = tools.get_sym('GAM{0}'.format(j))
             except IndexError:
                 # just ignore exception
                 pass
             if self.eta[j] == 1:
-                self.k[j] = var('k{0}'.format(j))
+                self.k[j] = tools.get_sym('k{0}'.format(j))
             else:
                 self.k[j] = 0
 
@@ -606,9 +793,9 @@ class Robot(object):
         """
         for j in range(1, self.NF):
             if self.sigma[j] == 0:
-                self.theta[j] = var('th{0}'.format(j))
+                self.theta[j] = tools.get_sym('th{0}'.format(j))
             elif self.sigma[j] == 1:
-                self.r[j] = var('r{0}'.format(j))
+                self.r[j] = tools.get_sym('r{0}'.format(j))
             elif self.sigma[j] == 2:
                 self.mu[j] = 0
 
@@ -618,17 +805,21 @@ class Robot(object):
         from the ones set in the ctor.
         """
         if self.is_floating or self.is_mobile:
-            self.G = Matrix([var('GX'), var('GY'), var('GZ')])
-            self.v0 = Matrix([var('VXb'), var('VYb'), var('VZb')])
-            self.w0 = Matrix([var('WXb'), var('WYb'), var('WZb')])
-            self.vdot0 = Matrix([var('VPXb'), var('VPYb'), var('VPZb')])
-            self.wdot0 = Matrix([var('WPXb'), var('WPYb'), var('WPZb')])
+            self.G = Matrix([tools.get_sym(n) for n in ('GX', 'GY', 'GZ')])
+            self.v0 = Matrix([tools.get_sym(n + 'b') for n in 'VX VY VZ'.split()])
+            self.w0 = Matrix([tools.get_sym(n + 'b') for n in 'WX WY WZ'.split()])
+            self.vdot0 = Matrix(
+                [tools.get_sym(n + 'b') for n in 'VPX VPY VPZ'.split()]
+            )
+            self.wdot0 = Matrix(
+                [tools.get_sym(n + 'b') for n in 'WPX WPY WPZ'.split()]
+            )
             # Z matrix
             for i in range(0, 3):
                 for j in range(0, 3):
-                    self.Z[i, j] = var('Zr{0}{1}'.format(i+1, j+1))
+                    self.Z[i, j] = tools.get_sym('Zr{0}{1}'.format(i+1, j+1))
             for j in range(0, 3):
-                self.Z[j, 3] = var('Zt{0}'.format(j+1))
+                self.Z[j, 3] = tools.get_sym('Zt{0}'.format(j+1))
 
 
     def get_inert_param(self, j):
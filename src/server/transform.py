@@ -25,12 +25,9 @@ def get_transformation_matrix(gamma, b, alpha, d, theta, r):
         between the frames.
     """
     # simplify computation
-    c_gamma = sympy.cos(gamma)
-    s_gamma = sympy.sin(gamma)
-    c_alpha = sympy.cos(alpha)
-    s_alpha = sympy.sin(alpha)
-    c_theta = sympy.cos(theta)
-    s_theta = sympy.sin(theta)
+    c_gamma, s_gamma = tools.cos_sin(gamma)
+    c_alpha, s_alpha = tools.cos_sin(alpha)
+    c_theta, s_theta = tools.cos_sin(theta)
     # intermediate terms
     sg_ca = s_gamma * c_alpha
     sg_sa = s_gamma * s_alpha
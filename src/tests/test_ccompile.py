@@ -0,0 +1,109 @@
+"""Tests du backend C"""
+import shutil
+
+import numpy as np
+import pytest
+from sympy import Matrix, var
+
+from outils import ccompile, samplerobots, symbolmgr
+from server import geometry
+
+PARAMS_RX90 = {'D3': 0.45, 'RL4': 0.42}
+
+avec_compilateur = pytest.mark.skipif(
+    shutil.which(ccompile.get_compiler()) is None,
+    reason="pas de compilateur C")
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    monkeypatch.setattr(ccompile, 'get_build_path', lambda: tmp_path)
+    return tmp_path
+
+
+def _modele_rx90():
+    rx90 = samplerobots.rx90()
+    symo = symbolmgr.SymbolManager(None)
+    J = geometry.compute_geometric_jacobian(rx90, symo=symo)
+    T = geometry.dgm(rx90, symo, 0, 6)
+    return rx90, symo, T, J
+
+
+@avec_compilateur
+def test_noyau_c_egal_a_numpy(build):
+    """MGD et Jacobien compilés donnent les valeurs de gen_vec_func"""
+    rx90, symo, T, J = _modele_rx90()
+    q = np.random.RandomState(6).uniform(-np.pi, np.pi, (50, 6))
+    args = list(rx90.q_vec)
+
+    for nom, expr in (('mgd', T), ('jac', J)):
+        f_c = symo.gen_c_func(nom, expr, args, PARAMS_RX90)
+        f_py = symo.gen_vec_func(nom, expr, args, PARAMS_RX90)
+
+        assert f_c is not f_py
+        assert np.allclose(f_c(q), f_py(q))
+        assert np.allclose(f_c(q[0]), f_py(q[0]))
+    assert len(list(build.glob('*.so'))) == 2
+    with pytest.raises(ValueError):
+        f_c(q[:, :5])
+
+
+@avec_compilateur
+def test_objet_partage_reutilise(build):
+    """Un second gestionnaire réutilise l'objet déjà compilé"""
+    rx90, symo, T, J = _modele_rx90()
+    symo.gen_c_func('mgd', T, list(rx90.q_vec), PARAMS_RX90)
+    date = next(build.glob('*.so')).stat().st_mtime_ns
+
+    rx90, autre, T, J = _modele_rx90()
+    autre.gen_c_func('mgd', T, list(rx90.q_vec), PARAMS_RX90)
+
+    assert next(build.glob('*.so')).stat().st_mtime_ns == date
+
+
+def test_repli_sans_compilateur(build, monkeypatch):
+    """Sans compilateur, la fonction NumPy est utilisée"""
+    monkeypatch.setenv('CC', 'compilateur-absent')
+    rx90, symo, T, J = _modele_rx90()
+    args = list(rx90.q_vec)
+
+    f = symo.gen_c_func('mgd', T, args, PARAMS_RX90)
+
+    assert f is symo.gen_vec_func('mgd', T, args, PARAMS_RX90)
+    with pytest.raises(ccompile.CompileError):
+        symo.gen_c_func('mgd', T, args, PARAMS_RX90, fallback=False)
+    with pytest.raises(ValueError):
+        symo.gen_c_func('mgd', T, args)
+
+
+def test_echec_en_cache(build, monkeypatch):
+    """Un échec de compilation n'est pas retenté pour le même modèle"""
+    monkeypatch.setenv('CC', 'compilateur-absent')
+    rx90, symo, T, J = _modele_rx90()
+    args = list(rx90.q_vec)
+    appels = []
+    compile_source = ccompile.compile_source
+
+    def compile_compte(source):
+        appels.append(source)
+        return compile_source(source)
+    monkeypatch.setattr(ccompile, 'compile_source', compile_compte)
+
+    f = symo.gen_c_func('mgd', T, args, PARAMS_RX90)
+
+    assert symo.gen_c_func('mgd', T, args, PARAMS_RX90) is f
+    with pytest.raises(ccompile.CompileError):
+        symo.gen_c_func('mgd', T, args, PARAMS_RX90, fallback=False)
+    assert len(appels) == 1
+
+
+@avec_compilateur
+def test_noms_locaux_du_c(build):
+    """Les symboles nommés comme les variables locales du C sont admis"""
+    symo = symbolmgr.SymbolManager(None)
+    x, y, k, n = var('x y k n')
+    expr = Matrix([x*y + k, n - x])
+    f = symo.gen_c_func('locaux', expr, [x, y, k, n], fallback=False)
+    q = np.array([[1., 2., 3., 4.], [.5, -1., 2., 0.]])
+    assert np.allclose(f(q), symo.gen_vec_func('locaux', expr,
+                                               [x, y, k, n])(q))
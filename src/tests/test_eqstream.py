@@ -0,0 +1,48 @@
+"""Tests du flux d'équations NDJSON"""
+import json
+
+from outils import eqstream, modelcache, samplerobots, tools
+from server.geometry import direct_geometric
+
+
+def test_flux_relu_a_l_identique():
+    """Le flux contient chaque équation et se relit sans analyse du texte"""
+    rx90 = samplerobots.rx90()
+
+    symo = direct_geometric(rx90, [(0, 6)], True, stream=True)
+
+    chemin = eqstream.get_stream_path(rx90, 'trm')
+    records = list(eqstream.read_records(chemin))
+    assert [r['index'] for r in records] == list(range(len(records)))
+    assert [r['sym'] for r in records] == [str(s) for s in symo.order_list]
+    s = symo.order_list[-1]
+    assert records[-1]['ops'] == tools.op_count(symo.sydi[s])
+    assert records[-1]['deps'] == sorted(str(d) for d in symo.deps[s])
+
+    relu = eqstream.load(chemin)
+
+    assert relu.order_list == symo.order_list
+    assert relu.sydi == symo.sydi
+    assert relu.deps == symo.deps
+    assert all(s is tools.get_sym(str(s)) for s in relu.order_list)
+    assert relu.sift_syms({s}, set()) == symo.sift_syms({s}, set())
+
+
+def test_flux_apres_cse_et_depuis_le_cache(tmp_path, monkeypatch):
+    """Seul le modèle final est écrit, aussi quand il vient du cache"""
+    monkeypatch.setattr(modelcache, 'get_cache_path', lambda: tmp_path)
+    rx90 = samplerobots.rx90()
+    chemin = eqstream.get_stream_path(rx90, 'trm')
+
+    symo = direct_geometric(rx90, [(0, 6)], True, cse=True, stream=True,
+                            use_cache=True)
+    with open(chemin) as f:
+        texte = f.read()
+    chemin.unlink()
+    direct_geometric(rx90, [(0, 6)], True, cse=True, stream=True,
+                     use_cache=True)
+
+    noms = [json.loads(ligne)['sym'] for ligne in texte.splitlines()]
+    assert noms == [str(s) for s in symo.order_list]
+    with open(chemin) as f:
+        assert f.read() == texte
@@ -0,0 +1,269 @@
+"""Tests du modèle géométrique"""
+import copy
+import pickle
+
+import numpy as np
+import pytest
+from sympy import Matrix, lambdify, symbols
+
+from outils import filemgr, samplerobots, symbolmgr
+from server import geometry
+from server.geometry import direct_geometric
+from server.numgeometry import direct_geometric_batch
+
+
+@pytest.mark.parametrize('axe', [0, 1, 2])
+def test_rotations_en_place(axe):
+    """Les mises à jour de lignes et colonnes égalent les produits"""
+    th, p = symbols('th p')
+    M = Matrix(4, 4, symbols('m0:16'))
+    R = geometry._rot(axe, th)
+
+    assert geometry._rot_right(M[:, :3], axe, th) == M[:, :3] * R
+    assert geometry._rot_left(M[:3, :], axe, th) == R * M[:3, :]
+    for col in range(3):
+        attendu = list((M[:, :3] * R)[:, col])
+        assert geometry._rot_right_col(M[:, :3], axe, th, col) == attendu
+    attendu = M * geometry._rot_trans(axe, th, p)
+    assert geometry._rot_trans_right(M.copy(), axe, th, p) == attendu
+
+
+@pytest.mark.parametrize('inverse', [False, True])
+def test_transform_sr400(inverse):
+    """_transform donne le même résultat que le produit des matrices"""
+    robo = samplerobots.sr400()
+    for j in range(1, robo.NF):
+        signe = -1 if inverse else 1
+        R1 = geometry._rot_trans(2, signe*robo.gamma[j], signe*robo.b[j])
+        R2 = geometry._rot_trans(0, signe*robo.alpha[j], signe*robo.d[j])
+        R3 = geometry._rot_trans(2, signe*robo.theta[j], signe*robo.r[j])
+        attendu = R3*R2*R1 if inverse else R1*R2*R3
+        assert geometry._transform(robo, j, inverse) == attendu
+
+
+def _jacobien_numerique(robo, params, q, ee, h=1e-6):
+    """Jacobien par différences finies sur le MGD numérique"""
+    from server.numgeometry import direct_geometric_batch
+    q = np.asarray(q, dtype=float)
+    dq = np.eye(len(q)) * h
+    T = direct_geometric_batch(robo, np.vstack([q + dq, q - dq]), params)
+    T_plus, T_moins = T[:len(q), ee], T[len(q):, ee]
+    R = direct_geometric_batch(robo, q[None], params)[0, ee, :3, :3]
+    J = np.zeros((6, len(q)))
+    for k in range(len(q)):
+        J[:3, k] = (T_plus[k, :3, 3] - T_moins[k, :3, 3]) / (2*h)
+        W = (T_plus[k, :3, :3] - T_moins[k, :3, :3]) / (2*h) @ R.T
+        J[3:, k] = W[2, 1], W[0, 2], W[1, 0]
+    return J
+
+
+@pytest.mark.parametrize('robot, params', [
+    (samplerobots.rx90, {'D3': 0.45, 'RL4': 0.42}),
+    (samplerobots.cart_pole, {}),
+])
+def test_jacobien_differences_finies(robot, params):
+    """Le Jacobien géométrique correspond au MGD dérivé"""
+    robo = robot()
+    symo = symbolmgr.SymbolManager(None)
+    J = geometry.compute_geometric_jacobian(robo, symo=symo)
+    q = np.random.RandomState(2).uniform(-1, 1, len(robo.q_vec))
+
+    f = symo.gen_vec_func('jac', J, list(robo.q_vec), params)
+
+    attendu = _jacobien_numerique(robo, params, q, robo.NF - 1)
+    assert np.allclose(f(q), attendu, atol=1e-6)
+
+
+def test_mcd_exprime_en_variables_articulaires():
+    """Le MCD ne contient que les variables et paramètres du robot"""
+    robo = samplerobots.rx90()
+    qdot = [0.1] * (robo.NJ - 1)
+
+    J, twist = geometry.direct_kinematic(robo, qdot)
+
+    noms = set(str(s) for s in J.free_symbols | twist.free_symbols)
+    assert noms <= set(str(q) for q in robo.q_vec) | {'D3', 'RL4'}
+    f = lambdify(list(robo.q_vec), J.subs({'D3': 0.45, 'RL4': 0.42}))
+    q = np.random.RandomState(3).uniform(-1, 1, len(robo.q_vec))
+    attendu = _jacobien_numerique(robo, {'D3': 0.45, 'RL4': 0.42}, q,
+                                  robo.NF - 1)
+    assert np.allclose(np.array(f(*q), dtype=float), attendu, atol=1e-6)
+
+
+def test_jacobien_ecrit_le_fichier():
+    """Le modèle du Jacobien est écrit dans le fichier _jac"""
+    robo = samplerobots.rx90()
+
+    J = geometry.compute_geometric_jacobian(robo)
+
+    chemin = filemgr.get_file_path(robo, 'jac')
+    with open(chemin) as f:
+        contenu = f.read()
+    assert 'T0T611 = ' in contenu
+    assert contenu.rstrip().endswith('*=*')
+    assert J.shape == (6, 6)
+
+
+def test_jacobien_projete_dans_chaque_repere():
+    """kJ ramené dans le repère 0 par kR0 donne 0J"""
+    rx90 = samplerobots.rx90()
+    params = {'D3': 0.45, 'RL4': 0.42}
+    q = np.random.RandomState(3).uniform(-1, 1, 6)
+    symo = symbolmgr.SymbolManager(None)
+    J0 = geometry.jacobian_in_frame(rx90, symo, 0)[0]
+    attendu = symo.gen_vec_func('jac0', J0, list(rx90.q_vec), params)(q)
+
+    for k in range(1, rx90.NF):
+        symo = symbolmgr.SymbolManager(None)
+        J, kR0 = geometry.jacobian_in_frame(rx90, symo, k)
+        Jk = symo.gen_vec_func('jac', J, list(rx90.q_vec), params)(q)
+        R = symo.gen_vec_func('rot', kR0, list(rx90.q_vec), params)(q)
+        assert np.allclose(R.T @ Jk[:3], attendu[:3])
+        assert np.allclose(R.T @ Jk[3:], attendu[3:])
+
+
+def test_repere_de_projection_optimal():
+    """Le repère retenu est le moins coûteux, moins cher que le repère 0"""
+    rx90 = samplerobots.rx90()
+
+    k, J, kR0, couts = geometry.optimal_jacobian_frame(rx90)
+
+    totaux = dict((c[0], c[1] + c[2]) for c in couts)
+    assert totaux[k] == min(totaux.values())
+    assert totaux[k] < totaux[0]
+
+
+def test_reglage_des_options_du_mgd():
+    """tune_dgm essaie chaque combinaison et garde la moins coûteuse"""
+    rx90 = samplerobots.rx90()
+
+    options, table = geometry.tune_dgm(rx90, 0, 6)
+
+    assert len(table) == len(geometry.dgm_options())
+    cout = [ops for opt, ops in table if opt == options][0]
+    assert cout == min(ops for _, ops in table)
+    symo = direct_geometric(rx90, [(0, 6)], True, tune=True)
+    with open(symo.file_out.name) as f:
+        assert 'Options of 0 T 6' in f.read()
+
+
+def test_mgd_partage_et_inverse():
+    """Les produits partagés donnent les mêmes iTj, jTi est transposé"""
+    rx90 = samplerobots.rx90()
+    params = {'D3': 0.45, 'RL4': 0.42}
+    frames = [(0, 6), (0, 3), (6, 0), (5, 2)]
+    q = np.random.RandomState(4).uniform(-1, 1, 6)
+
+    ref = direct_geometric(rx90, frames, True)
+    symo = direct_geometric(rx90, frames, True, shared=True)
+
+    for i, j in frames:
+        nom = 'T%sT%s' % (i, j)
+        T = Matrix(3, 4, lambda a, b: symbols('%s%s%s' % (nom, a+1, b+1)))
+        attendu = ref.gen_vec_func('ref', T, list(rx90.q_vec), params)(q)
+        obtenu = symo.gen_vec_func('shr', T, list(rx90.q_vec), params)(q)
+        assert np.allclose(obtenu, attendu)
+    cache = {}
+    T06 = geometry.dgm_shared(rx90, symo, 0, 6, cache)
+    assert (0, 3) in cache and (0, 5) in cache
+    T60 = geometry.dgm_shared(rx90, symo, 6, 0, cache)
+    assert T60[:3, :3] == T06[:3, :3].T
+
+
+def test_constantes_liees():
+    """Les constantes liées sont remplacées avant le calcul du MGD"""
+    rx90 = samplerobots.rx90()
+    symo = symbolmgr.SymbolManager(None)
+    T = geometry.dgm(rx90, symo, 0, 6)
+    ops = symo.model_ops(list(T))
+
+    rx90.bind({'D3': 0.45, 'RL4': 0}, keep=['RL4'])
+    assert rx90.constants == {'D3': 0.45}
+    rx90.bind({'RL4': 0})
+    symo = symbolmgr.SymbolManager(None)
+    T = geometry.dgm(rx90, symo, 0, 6)
+
+    assert symo.model_ops(list(T)) < ops
+    q = np.random.RandomState(5).uniform(-1, 1, (10, 6))
+    f = symo.gen_vec_func('mgd', T, list(rx90.q_vec), {})
+    attendu = direct_geometric_batch(rx90, q)[:, 6]
+    assert np.allclose(f(q), attendu)
+    rx90.unbind(['RL4'])
+    assert list(rx90.constants) == ['D3']
+
+
+def test_suivi_des_modifications():
+    """Seules les valeurs modifiées par put_val sont enregistrées"""
+    rx90 = samplerobots.rx90()
+    rx90.clear_changes()
+
+    rx90.put_val(3, 'd', rx90.get_val(3, 'd'))
+    rx90.put_val(2, 'M', 1)
+    assert rx90.changed_frames() == set()
+    rx90.put_val(3, 'd', 'L3')
+    rx90.put_val(5, 'ant', 3)
+    assert rx90.changed_frames() == {3, 5}
+    rx90.clear_changes()
+    rx90.bind({'RL4': 0.42})
+    assert rx90.changed_frames() == set(range(1, 7))
+
+
+def test_copie_garde_les_modifications():
+    """Une copie du robot garde ses modifications sans en ajouter"""
+    rx90 = samplerobots.rx90()
+    rx90.clear_changes()
+    rx90.put_val(3, 'd', 'L3')
+
+    for copie in (copy.deepcopy(rx90), pickle.loads(pickle.dumps(rx90))):
+        assert copie.changed_frames() == {3}
+        copie.put_val(5, 'ant', 3)
+        assert copie.changed_frames() == {3, 5}
+        assert copie.chain(6) == [6, 5, 3, 2, 1]
+    assert rx90.changed_frames() == {3}
+
+
+def test_regeneration_incrementale():
+    """Après une modification, seules les matrices concernées sont
+    recalculées et le modèle reste exact"""
+    rx90 = samplerobots.rx90()
+    frames = [(0, 6), (6, 0), (0, 3)]
+    model = geometry.GeometricModel(rx90, frames)
+    C1 = model.symo.sydi[symbols('C1')]
+    q = np.random.RandomState(7).uniform(-1, 1, (10, 6))
+    params = {'D3': 0.45, 'RL4': 0.42, 'L6': 0.1}
+
+    assert model.update() == set()
+    rx90.put_val(6, 'd', 'L6')
+    recalcul = model.update()
+
+    assert (0, 3) not in recalcul and (0, 6) in recalcul
+    assert model.symo.sydi[symbols('C1')] is C1
+    attendu = direct_geometric_batch(rx90, q, params)
+    args = list(rx90.q_vec)
+    for i, j in frames:
+        f = model.symo.gen_vec_func('T', model.matrices[i, j], args, params)
+        assert np.allclose(f(q), attendu[:, j] if i == 0 else
+                           np.linalg.inv(attendu[:, i]))
+    for n, s in enumerate(model.symo.order_list):
+        assert model.symo.position[s] == n
+    texte = model.write().file_out.getvalue()
+    assert 'T0T614 = ' in texte and 'L6' in texte
+
+
+def test_entetes_avec_ecriture_differee():
+    """Avec cse ou optimize, la table des options et les en-têtes
+    restent dans le fichier"""
+    rx90 = samplerobots.rx90()
+
+    symo = direct_geometric(rx90, [(0, 6), (6, 0)], True, cse=True,
+                            tune=True, optimize=True)
+
+    with open(symo.file_out.name) as f:
+        texte = f.read()
+    assert 'Options of 0 T 6' in texte
+    assert 'Tramsformation matrix 0 T 6' in texte
+    assert 'Tramsformation matrix 6 T 0' in texte
+    assert texte.index('Tramsformation matrix 6 T 0') < \
+        texte.index('T6T011 = ')
+    with pytest.raises(ValueError):
+        direct_geometric(rx90, [(0, 6)], True, shared=True, tune=True)
@@ -0,0 +1,56 @@
+"""Tests du cache des modèles"""
+import os
+
+import pytest
+from sympy import Symbol
+
+from outils import modelcache, samplerobots
+from server.geometry import direct_geometric
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(modelcache, 'get_cache_path', lambda: tmp_path)
+    return tmp_path
+
+
+def test_mgd_relu_depuis_le_cache(cache):
+    """Le second calcul relit le modèle et le fichier de sortie"""
+    rx90 = samplerobots.rx90()
+    symo = direct_geometric(rx90, [(0, 6)], True, use_cache=True)
+    with open(symo.file_out.name) as f:
+        texte = f.read()
+
+    relu = direct_geometric(rx90, [(0, 6)], True, use_cache=True)
+
+    assert len(list(cache.glob('*.pkl'))) == 1
+    assert relu.order_list == symo.order_list
+    assert relu.sydi == symo.sydi
+    assert relu.position == symo.position
+    with open(relu.file_out.name) as f:
+        assert f.read() == texte
+
+
+def test_cle_depend_des_parametres():
+    """Changer un paramètre ou une option change la clé"""
+    rx90 = samplerobots.rx90()
+    cle = modelcache.make_key(rx90, 'trm', frames=[(0, 6)])
+
+    assert modelcache.make_key(rx90, 'trm', frames=[(0, 6)]) == cle
+    assert modelcache.make_key(rx90, 'trm', frames=[(0, 5)]) != cle
+    rx90.put_val(3, 'd', Symbol('D33'))
+    assert modelcache.make_key(rx90, 'trm', frames=[(0, 6)]) != cle
+
+
+def test_eviction_des_entrees_anciennes(cache):
+    """Les entrées les moins récemment utilisées sont supprimées"""
+    for i, cle in enumerate(['a', 'b', 'c']):
+        modelcache.store(cle, b'x' * 1000)
+        os.utime(cache / ('%s.pkl' % cle), (i, i))
+
+    modelcache.load('a')
+    modelcache.store('d', b'x' * 1000, max_size=3500)
+
+    restantes = sorted(p.stem for p in cache.glob('*.pkl'))
+    assert restantes == ['a', 'c', 'd']
+    assert modelcache.load('b') is None
@@ -0,0 +1,65 @@
+"""Tests du MGD numérique vectorisé"""
+import numpy as np
+import pytest
+from sympy import Symbol
+
+from outils import samplerobots, symbolmgr
+from server.geometry import dgm
+from server.numgeometry import NumericGeometric, direct_geometric_batch
+
+
+RX90_PARAMS = {'D3': 0.45, 'RL4': 0.42}
+
+
+def _sympy_pose(robo, j, q, params):
+    """Référence : MGD symbolique évalué numériquement"""
+    symo = symbolmgr.SymbolManager(None)
+    T = dgm(robo, symo, 0, j, fast_form=False, trig_subs=False)
+    values = {robo.q_vec[k]: float(q[k]) for k in range(len(q))}
+    values.update({Symbol(name): val for name, val in params.items()})
+    T = T.subs(values).evalf()
+    return np.array([[float(T[i, k]) for k in range(4)] for i in range(4)])
+
+
+def test_forme_du_resultat():
+    """Vérifie la forme (N, NF, 4, 4) du résultat"""
+    rx90 = samplerobots.rx90()
+    q = np.zeros((7, len(rx90.q_vec)))
+
+    T = direct_geometric_batch(rx90, q, RX90_PARAMS)
+
+    assert T.shape == (7, rx90.NF, 4, 4)
+    assert np.allclose(T[:, 0], np.eye(4))
+
+
+def test_rx90_conforme_au_modele_symbolique():
+    """Le MGD numérique doit coïncider avec le MGD sympy"""
+    rx90 = samplerobots.rx90()
+    rng = np.random.RandomState(0)
+    q = rng.uniform(-np.pi, np.pi, (3, len(rx90.q_vec)))
+
+    T = NumericGeometric(rx90, RX90_PARAMS)(q)
+
+    for j in range(1, rx90.NF):
+        for n in range(q.shape[0]):
+            ref = _sympy_pose(rx90, j, q[n], RX90_PARAMS)
+            assert np.allclose(T[n, j], ref)
+
+
+def test_cart_pole_articulation_prismatique():
+    """La translation d'une articulation prismatique est prise en compte"""
+    cp = samplerobots.cart_pole()
+    q = np.array([[0.7, 0.3]])
+
+    T = direct_geometric_batch(cp, q)
+
+    ref = _sympy_pose(cp, cp.NF - 1, q[0], {})
+    assert np.allclose(T[0, -1], ref)
+
+
+def test_parametre_manquant():
+    """Une constante géométrique sans valeur doit lever une erreur"""
+    rx90 = samplerobots.rx90()
+
+    with pytest.raises(ValueError):
+        NumericGeometric(rx90, {'D3': 0.45})
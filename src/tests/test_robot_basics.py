@@ -123,6 +123,26 @@ def test_common_root():
     assert root >= 0  # Doit retourner un indice valide
 
 
+def test_index_ancetres_arbre():
+    """chain et common_root sur un arbre, l'index suit les modifications"""
+    r = Robot('Arbre', NL=5, NJ=5, NF=5)
+    r.ant = [-1, 0, 1, 2, 1, 4, 0]
+
+    assert r.chain(5) == [5, 4, 1]
+    assert r.chain(5, 1) == [5, 4]
+    assert r.chain(5, 3) == [5, 4, 1]
+    assert r.common_root(3, 5) == 1
+    assert r.common_root(5, 4) == 4
+    assert r.common_root(3, 6) == 0
+    assert r.loop_chain(3, 5) == [3, 2, 1, 4, 5]
+
+    r.chain(5).append(0)
+    r.put_val(4, 'ant', 3)
+    assert r.chain(5) == [5, 4, 3, 2, 1]
+    r.ant[5] = 6
+    assert r.common_root(3, 5) == 0
+
+
 def test_q_vec():
     """Vérifie qu'on génère le vecteur des variables articulaires"""
     r = Robot('Bot', NL=2, NJ=2, NF=2)
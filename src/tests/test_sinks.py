@@ -0,0 +1,74 @@
+"""Tests des sorties du gestionnaire de symboles"""
+import gzip
+
+from outils import samplerobots, sinks, symbolmgr
+from server.geometry import direct_geometric
+
+
+def _ecrire(symo):
+    symo.write_line('Titre')
+    symo.write_equation('A', 'B + 1')
+    symo.write_line()
+
+
+def test_tampon_en_memoire():
+    """BufferSink garde le texte, NullSink l'ignore"""
+    symo = symbolmgr.SymbolManager(sinks.BufferSink())
+    _ecrire(symo)
+    assert symo.file_out.getvalue() == 'Titre\nA = B + 1;\n\n'
+
+    symo = symbolmgr.SymbolManager(sinks.NullSink())
+    _ecrire(symo)
+    symo.flushout()
+    assert symo.file_out.getvalue() == ''
+
+
+def test_fichier_et_texte_identiques(tmp_path):
+    """FileSink écrit le fichier et rend le même texte, gardé ou relu"""
+    for garde in (True, False):
+        chemin = tmp_path / ('sortie_%s.txt' % garde)
+        symo = symbolmgr.SymbolManager(sinks.FileSink(chemin,
+                                                      keep_text=garde))
+        _ecrire(symo)
+        symo.flushout()
+        symo.file_close()
+
+        assert symo.file_out.getvalue() == chemin.read_text()
+        assert chemin.read_text().endswith('*=*\n')
+
+
+def test_fichier_gzip(tmp_path):
+    """GzipSink compresse la sortie"""
+    symo = symbolmgr.SymbolManager(sinks.GzipSink(tmp_path / 'sortie.txt'))
+    _ecrire(symo)
+    symo.file_close()
+
+    assert symo.file_out.name.endswith('.gz')
+    with gzip.open(symo.file_out.name, 'rt') as f:
+        assert f.read() == symo.file_out.getvalue()
+
+
+def test_mgd_lisible_apres_fermeture():
+    """Le texte du modèle est disponible après file_close"""
+    rx90 = samplerobots.rx90()
+
+    symo = direct_geometric(rx90, [(0, 6)], True)
+
+    with open(symo.file_out.name) as f:
+        assert symo.file_out.getvalue() == f.read()
+
+
+def test_texte_garde_sur_demande():
+    """Par défaut la sortie va au fichier seul, keep_text la garde"""
+    rx90 = samplerobots.rx90()
+    symo = symbolmgr.SymbolManager()
+
+    symo.file_open(rx90, 'trm')
+    assert symo.file_out._buffer is None
+    symo.file_close()
+
+    symo.file_open(rx90, 'trm', keep_text=True)
+    _ecrire(symo)
+    symo.file_close()
+    with open(symo.file_out.name) as f:
+        assert symo.file_out._buffer.getvalue() == f.read()
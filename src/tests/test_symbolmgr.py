@@ -0,0 +1,342 @@
+"""Tests du gestionnaire de symboles"""
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from sympy import Matrix, Symbol, cos, sin, count_ops, pi, symbols, zeros
+
+from outils import filemgr, samplerobots, symbolmgr
+from server.geometry import compute_geometric_jacobian, dgm, direct_geometric
+from server.numgeometry import direct_geometric_batch
+
+
+Q_RX90 = [0.1, -0.4, 0.7, 1.2, -0.3, 0.5]
+PARAMS_RX90 = {'D3': 0.45, 'RL4': 0.42}
+
+
+def _modele_rx90():
+    """MGD 0T6 du RX90 sous forme développée"""
+    rx90 = samplerobots.rx90()
+    symo = symbolmgr.SymbolManager(None)
+    T = dgm(rx90, symo, 0, 6, fast_form=False, trig_subs=True)
+    symo.mat_replace(T, 'T0T6', forced=True, skip=1)
+    return rx90, symo, T
+
+
+def _cout(symo):
+    return sum(count_ops(symo.sydi[s]) for s in symo.order_list)
+
+
+def test_cse_reduit_le_nombre_operations():
+    """La CSE doit réduire le coût total du modèle"""
+    rx90, symo, T = _modele_rx90()
+    cout_initial = _cout(symo)
+
+    nouveaux = symo.eliminate_common_subexpressions()
+
+    assert len(nouveaux) > 0
+    assert _cout(symo) < cout_initial
+
+
+def test_cse_conserve_le_resultat():
+    """Le modèle après CSE donne la même matrice numérique"""
+    rx90, ref, T = _modele_rx90()
+    symo = _modele_rx90()[1]
+    symo.eliminate_common_subexpressions()
+    q = list(rx90.q_vec)
+
+    f_ref = ref.gen_func('mgd_ref', T, q)
+    f_cse = symo.gen_func('mgd_cse', T, q)
+
+    for ligne_ref, ligne_cse in zip(f_ref(Q_RX90), f_cse(Q_RX90)):
+        assert ligne_cse == pytest.approx(ligne_ref)
+
+
+def test_cse_ordre_de_calcul():
+    """Chaque symbole est défini avant d'être utilisé"""
+    symo = _modele_rx90()[1]
+    symo.eliminate_common_subexpressions()
+
+    definis = set()
+    for s in symo.order_list:
+        utilises = symo.sydi[s].free_symbols & set(symo.sydi)
+        assert utilises <= definis
+        definis.add(s)
+
+
+def test_cse_ordre_reproductible():
+    """L'ordre des équations ne dépend pas du hachage des symboles"""
+    racine = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ("from tests.test_symbolmgr import _modele_rx90\n"
+            "symo = _modele_rx90()[1]\n"
+            "symo.eliminate_common_subexpressions()\n"
+            "print(symo.order_list)\n")
+    sorties = set()
+    for graine in ('1', '2', '3'):
+        env = dict(os.environ, PYTHONHASHSEED=graine, PYTHONPATH=racine)
+        sorties.add(subprocess.run([sys.executable, '-c', code], cwd=racine,
+                                   env=env, capture_output=True, text=True,
+                                   check=True).stdout)
+    assert len(sorties) == 1
+
+
+def test_direct_geometric_cse_ecrit_le_modele():
+    """Avec cse=True, toutes les équations sont écrites dans le fichier"""
+    rx90 = samplerobots.rx90()
+
+    symo = direct_geometric(rx90, [(0, 6)], True, cse=True)
+
+    with open(symo.file_out.name) as f:
+        contenu = f.read()
+    for s in symo.order_list:
+        assert '%s = ' % s in contenu
+    assert contenu.rstrip().endswith('*=*')
+
+
+def test_unfold_chaine():
+    """unfold développe complètement une chaîne de substitutions"""
+    symo = symbolmgr.SymbolManager(None)
+    a, b, x, y = symbols('A B x y')
+    symo.add_to_dict(a, x + y)
+    symo.add_to_dict(b, a * x)
+
+    assert symo.unfold(b + 1) == (x + y) * x + 1
+    assert symo.unfold_sym(b) == (x + y) * x
+
+
+def test_mat_unfold_apres_cse():
+    """Le modèle déplié est le même avant et après la CSE"""
+    rx90, ref, T = _modele_rx90()
+    symo = _modele_rx90()[1]
+    symo.eliminate_common_subexpressions()
+
+    attendu = ref.mat_unfold(T.copy())
+    obtenu = symo.mat_unfold(T.copy())
+
+    assert (attendu - obtenu).expand() == zeros(4, 4)
+
+
+@pytest.mark.parametrize('robot', [samplerobots.rx90, samplerobots.sr400])
+def test_trig_replace_micro_benchmark(robot):
+    """La substitution groupée donne le résultat de subs, plus vite"""
+    robo = robot()
+    T = dgm(robo, symbolmgr.SymbolManager(None), 0, robo.NF - 1,
+            fast_form=False, trig_subs=False)
+    angles = [a for j in range(robo.NF) for a in robo.get_angles(j)]
+
+    debut = time.perf_counter()
+    ref = T.copy()
+    for angle, name in angles:
+        regles = {cos(angle): Symbol('C%s' % name),
+                  sin(angle): Symbol('S%s' % name)}
+        ref = ref.applyfunc(lambda e: e.subs(regles))
+    duree_subs = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    M = T.copy()
+    symo = symbolmgr.SymbolManager(None)
+    for angle, name in angles:
+        symo.trig_replace(M, angle, name)
+    duree_groupee = time.perf_counter() - debut
+
+    assert M == ref
+    assert duree_groupee < duree_subs
+
+
+def test_sift_syms_tranche_minimale():
+    """Seuls les symboles nécessaires sont retenus, dans l'ordre de calcul"""
+    symo = symbolmgr.SymbolManager(None)
+    a, b, c, d, x, y = symbols('A B C D x y')
+    symo.add_to_dict(a, x + y)
+    symo.add_to_dict(b, 2*x)
+    symo.add_to_dict(c, a * x)
+    symo.add_to_dict(d, c + a)
+
+    res = symo.sift_syms({d}, set())
+
+    assert set(res[:2]) == {x, y}
+    assert res[2:] == [a, c, d]
+    assert symo.deps[d] == {a, c}
+
+
+def test_index_apres_cse():
+    """L'index des dépendances suit la réorganisation de la CSE"""
+    symo = _modele_rx90()[1]
+    symo.eliminate_common_subexpressions()
+
+    for i, s in enumerate(symo.order_list):
+        assert symo.position[s] == i
+        assert symo.deps[s] == symo.sydi[s].free_symbols
+
+
+def test_gen_vec_func_lot_de_configurations():
+    """La fonction vectorisée donne 0T6 pour tout un lot"""
+    rx90, symo, T = _modele_rx90()
+    q = np.random.RandomState(0).uniform(-np.pi, np.pi, (200, 6))
+
+    f = symo.gen_vec_func('mgd_vec', T, list(rx90.q_vec), PARAMS_RX90)
+
+    attendu = direct_geometric_batch(rx90, q, PARAMS_RX90)[:, 6]
+    assert f(q).shape == (200, 4, 4)
+    assert np.allclose(f(q), attendu)
+    assert np.allclose(f(q[3]), attendu[3])
+
+
+def test_gen_vec_func_cache_et_parametres():
+    """La fonction est mise en cache, les paramètres manquants sont signalés"""
+    rx90, symo, T = _modele_rx90()
+    q = list(rx90.q_vec)
+
+    f = symo.gen_vec_func('mgd_vec', T, q, PARAMS_RX90)
+
+    assert symo.gen_vec_func('mgd_vec', T, q, PARAMS_RX90) is f
+    with pytest.raises(ValueError):
+        symo.gen_vec_func('mgd_vec', T, q)
+
+
+def test_gen_vec_func_noms_locaux():
+    """Les symboles nommés comme les variables locales sont admis"""
+    x, prefix, empty, sin_ = symbols('x prefix empty sin')
+    symo = symbolmgr.SymbolManager(None)
+    symo.add_to_dict(prefix, 2*x)
+    expr = Matrix([prefix*empty + cos(x), sin_ + pi*x])
+
+    f = symo.gen_vec_func('locaux', expr, [x, empty, sin_])
+
+    q = np.array([[1., 2., 3.], [.5, -1., 2.]])
+    attendu = [[2*a*b + np.cos(a), c + np.pi*a] for a, b, c in q]
+    assert np.allclose(f(q)[..., 0], attendu)
+
+
+def test_gen_vec_func_symbole_multivalue():
+    """Un symbole à plusieurs valeurs est signalé par son nom"""
+    a, b, x = symbols('a b x')
+    symo = symbolmgr.SymbolManager(None)
+    symo.add_to_dict(x, (a + b, a - b))
+
+    with pytest.raises(ValueError, match='x'):
+        symo.gen_vec_func('f', [x], [a, b])
+
+
+def test_merge_dedoublonne_et_renomme():
+    """Les définitions identiques sont partagées, les conflits renommés"""
+    x, y = symbols('x y')
+    a, b, c = symbols('A B C')
+    symo = symbolmgr.SymbolManager(None)
+    symo.add_to_dict(a, x + y)
+    symo.add_to_dict(b, x * y)
+    autre = symbolmgr.SymbolManager(None)
+    autre.add_to_dict(a, x + y)
+    autre.add_to_dict(b, x - y)
+    autre.add_to_dict(c, a * b)
+
+    renames = symo.merge(autre)
+
+    b1 = Symbol('B_1')
+    assert renames == {b: b1}
+    assert symo.order_list == [a, b, b1, c]
+    assert symo.sydi[b1] == x - y
+    assert symo.sydi[c] == a * b1
+
+
+def test_direct_geometric_en_parallele():
+    """Le calcul réparti sur des processus donne les mêmes matrices"""
+    rx90 = samplerobots.rx90()
+    frames = [(0, 3), (0, 6), (6, 0)]
+
+    serie = direct_geometric(rx90, frames, True)
+    parallele = direct_geometric(rx90, frames, True, processes=2)
+
+    for i, j in frames:
+        nom = 'T%sT%s' % (i, j)
+        for s in serie.order_list:
+            if s.name.startswith(nom):
+                ecart = serie.unfold(s) - parallele.unfold(s)
+                assert ecart.expand() == 0
+
+
+def test_trig_replace_angle_decale():
+    """Un angle th + k*pi/2 est remplacé avec les bons signes"""
+    th = Symbol('th1')
+    M = Matrix([[cos(th + pi/2), sin(th - pi)], [cos(th), 1]])
+    symo = symbolmgr.SymbolManager(None)
+
+    res = symo.trig_replace(M.copy(), th + pi/2, 1)
+
+    assert res.free_symbols <= {Symbol('C1'), Symbol('S1')}
+    assert symo.unfold(res) == M
+
+
+def test_optimize_propage_et_elimine():
+    """Constantes et alias propagés, symboles inutiles supprimés"""
+    x, y = symbols('x y')
+    a, b, c, d, e = symbols('A B C D E')
+    cse1, cse4 = symbols('CSE1 CSE4')
+    symo = symbolmgr.SymbolManager(None)
+    symo.add_to_dict(a, sin(x) * 0 + 2)
+    symo.add_to_dict(b, x)
+    symo.add_to_dict(cse4, b * y + a)
+    symo.add_to_dict(c, cse4 * cos(y))
+    symo.add_to_dict(d, x + y)
+    symo.add_to_dict(e, b)
+
+    removed = symo.optimize([c, e])
+
+    assert set(removed) == {a, b, d}
+    assert symo.order_list == [cse1, c, e]
+    assert symo.sydi[cse1] == x * y + 2
+    assert symo.sydi[c] == cse1 * cos(y)
+    assert symo.sydi[e] == x
+    assert symo.revdi[x * y + 2] == cse1
+
+
+def test_jacobien_optimise_ecrit_moins_equations():
+    """Le fichier du Jacobien optimisé ne contient que le nécessaire"""
+    rx90 = samplerobots.rx90()
+    ref = symbolmgr.SymbolManager(None)
+    J = compute_geometric_jacobian(rx90, symo=ref)
+
+    J_opt = compute_geometric_jacobian(rx90, optimize=True)
+
+    with open(filemgr.get_file_path(rx90, 'jac')) as f:
+        contenu = f.read()
+    assert contenu.count(' = ') < len(ref.order_list)
+    assert 'T0T611 = ' not in contenu
+    assert J_opt == J
+
+
+def test_bilan_des_operations():
+    """Les opérations sont comptées par type, par équation et au total"""
+    x, y = symbols('x y')
+    a, b, c = symbols('A B C')
+    symo = symbolmgr.SymbolManager(None)
+    symo.add_to_dict(a, x*y + cos(x))
+    symo.add_to_dict(b, a/y - x)
+    symo.add_to_dict(c, 2*x)
+
+    rapport = symo.op_report()
+
+    assert rapport['equations'][a] == {'mul': 1, 'add': 1, 'div': 0,
+                                       'trig': 1, 'pow': 0, 'other': 0,
+                                       'total': 3}
+    assert rapport['total']['total'] == _cout(symo)
+    assert list(rapport['equations']) == [a, b, c]
+    partiel = symo.op_report([b, 3*b])
+    assert list(partiel['equations']) == [a, b]
+    assert partiel['total']['mul'] == 2
+
+
+def test_bilan_en_fin_de_fichier():
+    """Le fichier du modèle se termine par le bilan des opérations"""
+    rx90 = samplerobots.rx90()
+
+    symo = direct_geometric(rx90, [(0, 6)], True)
+
+    total = symo.op_report()['total']['total']
+    lignes = symo.file_out.getvalue().rstrip().splitlines()
+    assert lignes[-4] == 'Number of operations'
+    assert lignes[-3].endswith('total: %s' % total)
+    assert lignes[-1] == '*=*'
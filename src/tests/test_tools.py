@@ -38,4 +38,42 @@ def test_structure_types():
     """Vérifie les types de structure"""
     assert tools.SIMPLE in tools.TYPES
     assert tools.TREE in tools.TYPES
-    assert tools.CLOSED_LOOP in tools.TYPES
\ No newline at end of file
+    assert tools.CLOSED_LOOP in tools.TYPES
+
+def test_op_count_identique_a_count_ops():
+    """op_count donne le même résultat que count_ops"""
+    from sympy import sympify
+    for texte in ['-x - y', '-x + y', 'x - y', '-1/3', 'x/y - 2*z',
+                  '-(a + b)*c', '-2*x**2 - 3', 'C1*C2 - S1*S2 + D3*C2']:
+        expr = sympify(texte)
+        assert tools.op_count(expr) == expr.count_ops()
+
+
+def test_sym_less():
+    """sym_less compare le nombre d'opérations"""
+    from sympy import sympify
+    assert tools.sym_less(sympify('C23'), sympify('C2*C3 - S2*S3'))
+    assert not tools.sym_less(sympify('x + y'), sympify('x + y'))
+
+
+def test_get_sym_interne():
+    """Les symboles sont partagés et ne polluent pas l'espace de noms"""
+    assert tools.get_sym('C3') is tools.get_sym('C3')
+    assert tools.get_sym('C3') == Symbol('C3')
+    assert tools.cos_sin_syms('m23') == (Symbol('C23'), -Symbol('S23'))
+    assert tools.cos_sin_syms(4) == (Symbol('C4'), Symbol('S4'))
+    assert 'C4' not in vars(tools)
+
+
+def test_cos_sin_table_exacte():
+    """Les multiples de pi/4 sont lus dans la table"""
+    from sympy import sqrt, cos, sin
+    th = Symbol('th')
+    assert tools.cos_sin(pi/2) == (0, 1)
+    assert tools.cos_sin(-pi) == (-1, 0)
+    assert tools.cos_sin(0) == (1, 0)
+    assert tools.cos_sin(pi/4) == (sqrt(2)/2, sqrt(2)/2)
+    assert tools.cos_sin(th) == (cos(th), sin(th))
+    assert tools.split_right_angle(th + pi/2) == (pi/2, th)
+    assert tools.split_right_angle(th + pi/4) is None
+    assert tools.split_right_angle(th) is None
@@ -0,0 +1,84 @@
+"""Tests de la simplification trigonométrique"""
+from sympy import cos, sin, symbols, sympify
+
+from outils import samplerobots, symbolmgr, trigsimp
+
+
+def test_cs12_somme_angles():
+    """C2*C3 - S2*S3 devient C23 et C23 est défini"""
+    symo = symbolmgr.SymbolManager(None)
+
+    res = symo.CS12_simp(sympify('C2*C3 - S2*S3'))
+
+    assert res == sympify('C23')
+    assert symo.sydi[sympify('C23')] == sympify('C2*C3 - S2*S3')
+
+
+def test_cs12_avec_coefficient():
+    """Le facteur commun est conservé"""
+    symo = symbolmgr.SymbolManager(None)
+
+    res = symo.CS12_simp(sympify('C2*S3*R + S2*C3*R'))
+
+    assert res == sympify('R*S23')
+
+
+def test_cs12_difference_imbriquee():
+    """Une différence d'angles dans un produit est simplifiée"""
+    symo = symbolmgr.SymbolManager(None)
+
+    res = symo.CS12_simp(sympify('x*(C1*S2 - S1*C2)'), silent=True)
+
+    assert res == sympify('-x*S1m2')
+    assert sympify('S1m2') not in symo.sydi
+
+
+def test_cs12_en_cascade():
+    """C23 obtenu est à nouveau combiné avec l'angle 4"""
+    symo = symbolmgr.SymbolManager(None)
+    expr = sympify('(C2*C3 - S2*S3)*C4 - (S2*C3 + C2*S3)*S4').expand()
+
+    res = symo.CS12_simp(expr)
+
+    assert res == sympify('C234')
+
+
+def test_c2s2():
+    """C**2 + S**2 = 1 sous ses différentes formes"""
+    symo = symbolmgr.SymbolManager(None)
+
+    assert symo.C2S2_simp(sympify('a*C2**2 + a*S2**2 + b')) == sympify('a + b')
+    assert symo.C2S2_simp(sympify('-C2**2*RL + RL - D*S2')) == \
+        sympify('RL*S2**2 - D*S2')
+
+
+def test_c2s2_coefficients_differents():
+    """C**2 et S**2 de coefficients différents sont réduits en partie"""
+    symo = symbolmgr.SymbolManager(None)
+
+    assert symo.C2S2_simp(sympify('2*a*C2**2 + a*S2**2')) == \
+        sympify('a + a*C2**2')
+    assert symo.C2S2_simp(sympify('a*C2**2 + 3*a*S2**2 + b')) == \
+        sympify('a + 2*a*S2**2 + b')
+    assert symo.C2S2_simp(sympify('2*a*C2**2 - a*S2**2')) == \
+        sympify('3*a*C2**2 - a')
+
+
+def test_forme_longue():
+    """Les fonctions cos et sin sont aussi traitées"""
+    x, y = symbols('x y')
+
+    assert trigsimp.c2s2_simp(cos(x)**2 + sin(x)**2)[0] == 1
+    res, defs = trigsimp.cs12_simp(cos(x)*cos(y) - sin(x)*sin(y))
+    assert res == cos(x + y)
+
+
+def test_parametres_de_base_rx90():
+    """Le calcul des paramètres de base aboutit"""
+    rx90 = samplerobots.rx90()
+    rx90.set_defaults(base=True, joint=True)
+
+    symo, base_robo = rx90.compute_baseparams()
+
+    assert base_robo.name == 'RX90_base'
+    assert len(symo.sydi) > 0